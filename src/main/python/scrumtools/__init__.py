@@ -1,7 +1,10 @@
-from scrumtools import base, data, error, github, trello
+from scrumtools import audit, base, cache, courses, credentials, data, database, error, estimate, github, githubapi, \
+    output, provision, scheduler, seed, state, transport, trello, trelloapi, watch
 
 VERSION = (0, 0, 1)
 
 get_version = lambda: '.'.join(map(str, VERSION))
 
-__all__ = ['base', 'data', 'error', 'evaltool', 'github', 'trello']
\ No newline at end of file
+__all__ = ['audit', 'base', 'cache', 'courses', 'credentials', 'data', 'database', 'error', 'estimate', 'evaltool',
+           'github', 'githubapi', 'output', 'provision', 'scheduler', 'seed', 'state', 'transport', 'trello',
+           'trelloapi', 'watch']
\ No newline at end of file
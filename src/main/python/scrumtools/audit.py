@@ -0,0 +1,502 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import glob
+import time
+import hashlib
+import sqlite3
+import threading
+
+from cement.core import controller
+from requests.exceptions import RequestException
+
+from scrumtools import credentials, data, error, githubapi, output, scheduler, transport, trelloapi
+
+
+class AuditController(controller.CementBaseController):
+    class Meta:
+        label = 'audit'
+        interface = controller.IController
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        description = "Read-only snapshots of the GitHub and Trello organizations and drift reports."
+
+        config_section = 'audit'
+        config_defaults = dict(
+            # a directory (one JSON file per snapshot) or an SQLite database (*.db, *.sqlite)
+            snapshots=os.path.join('~', '.scrum-tools', 'audit'),
+        )
+
+        arguments = [
+            (['-U', '--users-file'],
+             dict(action='store', metavar='FILE', dest='users_file',
+                  help='a CSV file listing all users')),
+            (['-S', '--snapshots'],
+             dict(action='store', metavar='PATH', dest='snapshots',
+                  help='a directory or an SQLite database (*.db, *.sqlite) holding the snapshots')),
+            (['--since'],
+             dict(action='store', metavar='SNAPSHOT', dest='since', default=None,
+                  help='the snapshot to compare with (default: the previous one)')),
+            output.ARGUMENT,
+        ] + transport.ARGUMENTS
+
+    @controller.expose(hide=True)
+    def default(self):
+        self.app.args.parse_args(['--help'])
+
+    @controller.expose(help="Takes a snapshot of the GitHub and Trello organizations and reports the drift.")
+    def snapshot(self):
+        self.app.log.debug('Taking an audit snapshot.')
+
+        # validate required config parameters
+        if not self.app.config.get('core', 'users_file'):
+            raise error.ConfigError("Missing config parameter 'core.users_file'!")
+        if not self.app.config.get('github', 'auth_token') or not self.app.config.get('github', 'auth_id'):
+            raise error.ConfigError("Missing config parameter 'github.auth_id' and/or 'github.auth_token'! "
+                                    "Please run 'scrum-tools github authorize' first! ")
+        if not self.app.config.get('trello', 'auth_key') or not self.app.config.get('trello', 'auth_token'):
+            raise error.ConfigError("Missing config parameter 'trello.auth_key' and/or 'trello.auth_token'! "
+                                    "Please run 'scrum-tools trello authorize' first! ")
+
+        user_repository = data.UserRepository(self.app.config)
+        snapshots = store(self.app.config.get('audit', 'snapshots'))
+        ids = snapshots.ids()
+        previous = snapshots.load(ids[-1]) if ids else None
+
+        out = output.get()
+        crawler = Crawler(self.app.config, previous)
+        snapshot = crawler.run(report)
+        out.info("Read %d GitHub pages (%d not modified since the last snapshot)." % (
+            crawler.pages, crawler.not_modified), 'cyan')
+        if snapshot is None:
+            raise RuntimeError("Audit incomplete, no snapshot saved")
+
+        snapshots.save(snapshot)
+        out.info("Saved snapshot '%s'." % snapshot['id'], 'green', attrs=['bold'])
+
+        drifted = check(self.app.config, snapshot, user_repository)
+        out.info("%d resource(s) drifted from the users file." % drifted, 'green' if not drifted else 'red',
+                 attrs=['bold'])
+
+        if previous is not None:
+            since = snapshots.load(self.app.pargs.since) if self.app.pargs.since else previous
+            report_changes(since, snapshot)
+
+    @controller.expose(help="Shows the changes between the latest snapshot and '--since' (default: its predecessor).")
+    def diff(self):
+        snapshots = store(self.app.config.get('audit', 'snapshots'))
+        ids = snapshots.ids()
+        if len(ids) < 2 and not (ids and self.app.pargs.since):
+            raise RuntimeError("Not enough snapshots to compare (found %d)" % len(ids))
+        report_changes(snapshots.load(self.app.pargs.since or ids[-2]), snapshots.load(ids[-1]))
+
+
+class Crawler(object):
+    """
+    Reads the teams, team members, team repos and organization repos on GitHub and the boards, lists and board members
+    on Trello (concurrently, see scheduler.TaskGraph).
+
+    GitHub lists are read page by page with conditional requests for the ETags of the previous snapshot: if no page
+    changed, the list of the previous snapshot is reused (304 responses carry no content and do not count against
+    the rate limit). Trello does not support conditional requests, so the boards are read anew (see
+    trelloapi.BoardReader).
+    """
+
+    API_URL = 'https://api.github.com'
+    PER_PAGE = 100
+
+    # output actions of the crawl tasks (by task kind)
+    ACTIONS = {
+        ('github',): 'read_organization',
+        ('github', 'members'): 'read_members',
+        ('github', 'repos'): 'read_team_repos',
+        ('trello',): 'read_boards',
+    }
+
+    def __init__(self, config, previous=None):
+        self.__config = config
+        self.__github_organization = config.get('github', 'organization')
+        self.__trello_organization = config.get('trello', 'organization')
+
+        # reuse only the GitHub resources read for the same organization
+        if previous is not None and previous['github']['organization'] == self.__github_organization:
+            self.__previous = previous['github']['resources']
+        else:
+            self.__previous = dict()
+
+        self.__lock = threading.Lock()
+        self.__resources = dict()
+        self.__boards = dict()
+        self.__token_members = set()
+        self.pages = 0
+        self.not_modified = 0
+
+    def run(self, report=None):
+        """
+        Returns a new snapshot (or None if a resource could not be read).
+        """
+        created = time.time()
+        github_pool = credentials.github_pool(self.__config)
+        session = githubapi.PooledGitHubSession(github_pool)
+        client = trelloapi.TrelloClient(credentials.trello_pool(self.__config),
+                                        self.__config.get('trello', 'max_in_flight'))
+        try:
+            graph = scheduler.TaskGraph(dict(github=self.__config.get('github', 'max_in_flight'), trello=1))
+            graph.add(scheduler.Task('github', "Reading GitHub organization '%s'" % self.__github_organization,
+                                     lambda: self.__github(session), pool='github'))
+            graph.add(scheduler.Task('trello', "Reading Trello boards of '%s'" % self.__trello_organization,
+                                     lambda: self.__trello(client), pool='trello'))
+            status = graph.run(report)
+        finally:
+            session.close()
+            client.close()
+
+        if any(s != scheduler.TaskGraph.OK for s in status.values()):
+            return None
+
+        # millisecond IDs, so that successive snapshots do not collide (the stores refuse to overwrite a snapshot)
+        snapshot = dict(id=time.strftime('%Y%m%dT%H%M%S', time.gmtime(created)) + '.%03dZ' % (created % 1 * 1000),
+                        created=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(created)),
+                        github=dict(organization=self.__github_organization, resources=self.__resources),
+                        trello=dict(organization=self.__trello_organization, boards=self.__boards,
+                                    token_members=sorted(self.__token_members)))
+        snapshot['digests'] = dict(('%s:%s' % key, digest(record)) for key, record in view(snapshot).items())
+        return snapshot
+
+    def __github(self, session):
+        teams = self.__list(session, '/orgs/%s/teams' % self.__github_organization,
+                            lambda t: dict(id=t['id'], name=t['name']))
+        self.__list(session, '/orgs/%s/repos' % self.__github_organization, lambda r: r['name'])
+
+        def read(path, extract):
+            self.__list(session, path, extract)
+
+        tasks = []
+        for team in teams:
+            path = '/teams/%d' % team['id']
+            tasks.append(scheduler.Task('github:members:%s' % team['name'],
+                                        "Reading members of team '%s'" % team['name'],
+                                        lambda p=path: read(p + '/members', lambda m: m['login']),
+                                        pool='github'))
+            tasks.append(scheduler.Task('github:repos:%s' % team['name'],
+                                        "Reading repositories of team '%s'" % team['name'],
+                                        lambda p=path: read(p + '/repos', lambda r: r['name']),
+                                        pool='github'))
+        return tasks
+
+    def __list(self, session, path, extract):
+        """
+        Reads a GitHub list resource and returns its (extracted) items.
+        """
+        previous = self.__previous.get(path, dict(etags=[], items=[]))
+        etags, pages = [], []
+        while True:
+            page = len(pages) + 1
+            etag = previous['etags'][page - 1] if page <= len(previous['etags']) else None
+            resp = self.__get(session, path, page, etag)
+            etags.append(resp.headers.get('ETag') or etag)
+            if resp.status_code == 304:
+                pages.append(None)
+                # an unchanged last page is still the last one
+                if page == len(previous['etags']):
+                    break
+            else:
+                pages.append([extract(item) for item in resp.json()])
+                if len(pages[-1]) < self.PER_PAGE:
+                    break
+
+        with self.__lock:
+            self.pages += len(pages)
+            self.not_modified += len([p for p in pages if p is None])
+
+        if all(p is None for p in pages) and len(pages) == len(previous['etags']):
+            items = previous['items']
+        else:
+            # some pages changed, so the unchanged ones are needed as well
+            items = []
+            for page, items_page in enumerate(pages):
+                if items_page is None:
+                    items_page = [extract(item) for item in self.__get(session, path, page + 1).json()]
+                items.extend(items_page)
+
+        with self.__lock:
+            self.__resources[path] = dict(etags=etags, items=items)
+        return items
+
+    def __get(self, session, path, page, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        resp = session.get(self.API_URL + path, params=dict(per_page=self.PER_PAGE, page=page), headers=headers)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+        return resp
+
+    def __trello(self, client):
+        reader = trelloapi.BoardReader(client, self.__config.get('trello', 'read_mode'))
+        try:
+            client.organization(self.__trello_organization)
+        except RequestException:
+            raise error.TaskError("Organization '%s' not found" % self.__trello_organization)
+        self.__token_members = client.token_members()
+        boards = reader.boards(self.__trello_organization)
+        states = reader.states(boards)
+        for board in boards:
+            state = states[board['id']]
+            self.__boards[board['name']] = dict(id=board['id'], closed=bool(board.get('closed')),
+                                                lists=[l['name'] for l in state.lists],
+                                                admins=sorted(state.admins), members=sorted(state.members))
+
+
+def report(task, status, e):
+    """
+    Reports a finished crawl task (see output.Reporter).
+    """
+    parts = task.name.split(':', 2)
+    action = Crawler.ACTIONS.get(tuple(parts[:2]), task.name)
+    resource = parts[2] if len(parts) > 2 else parts[0]
+    message = task.message
+    if status == scheduler.TaskGraph.SKIPPED:
+        message = "Skipping: %s (a prerequisite failed)." % message
+    output.get().done(resource, action, message, status, task.latency, e)
+
+
+def view(snapshot):
+    """
+    Returns the resources of a snapshot as a dict that maps (kind, name) to a record of sorted item lists.
+    """
+    resources = snapshot['github']['resources']
+    organization = snapshot['github']['organization']
+    resources_view = dict()
+    for team in resources.get('/orgs/%s/teams' % organization, dict(items=[]))['items']:
+        path = '/teams/%d' % team['id']
+        resources_view[('team', team['name'])] = dict(
+            members=sorted(resources.get(path + '/members', dict(items=[]))['items']),
+            repos=sorted(resources.get(path + '/repos', dict(items=[]))['items']))
+    for repo in resources.get('/orgs/%s/repos' % organization, dict(items=[]))['items']:
+        resources_view[('repo', repo)] = dict()
+    for name, board in snapshot['trello']['boards'].items():
+        resources_view[('board', name)] = dict(closed=board['closed'], lists=board['lists'], admins=board['admins'],
+                                               members=board['members'])
+    return resources_view
+
+
+def digest(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True)).hexdigest()
+
+
+def check(config, snapshot, user_repository):
+    """
+    Reports the drift of the snapshot from the users file and returns the number of drifted resources.
+    """
+    # schema keys
+    key_github = config.get('core', 'users_schema_key_github')
+    key_trello = config.get('core', 'users_schema_key_trello')
+    # teams setup
+    team_admins = config.get('github', 'team_admins')
+    team_admins_group = config.get('github', 'team_admins_group')
+    team_users = config.get('github', 'team_users')
+    team_pattern = config.get('github', 'team_pattern')
+    # repos setup
+    repo_admins = config.get('github', 'repo_admins')
+    repo_users = config.get('github', 'repo_users')
+    repo_pattern = config.get('github', 'repo_pattern')
+    # boards setup
+    board_admins_name = config.get('trello', 'board_admins')
+    board_pattern = config.get('trello', 'board_pattern')
+    board_lists = config.get('trello', 'board_lists')
+    admins_group = config.get('trello', 'board_admins_group')
+
+    # account names are case insensitive
+    accounts = lambda key, group=None: set(a.lower() for a in user_repository.accounts(key, group) if a)
+    groups = list(user_repository.groups())
+    group_repos = [repo_pattern % int(group) for group in groups]
+    actual = view(snapshot)
+
+    # expected (kind, name) -> record
+    expected = dict()
+    for group in groups:
+        expected[('team', team_pattern % int(group))] = dict(members=accounts(key_github, group),
+                                                             repos=set([repo_pattern % int(group)]))
+    expected[('team', team_admins)] = dict(members=accounts(key_github, team_admins_group),
+                                           repos=set(group_repos + [repo_admins, repo_users]))
+    expected[('team', team_users)] = dict(members=accounts(key_github), repos=set([repo_users]))
+    for repo in group_repos + [repo_admins, repo_users]:
+        expected[('repo', repo)] = dict()
+    board_admins = accounts(key_trello, admins_group)
+    for group in groups:
+        expected[('board', board_pattern % int(group))] = dict(admins=board_admins, lists=board_lists,
+                                                               members=board_admins | accounts(key_trello, group))
+    expected[('board', board_admins_name)] = dict(admins=board_admins, lists=board_lists, members=board_admins)
+
+    # the owners of the API tokens create and administer the boards, so they are members of all of them
+    token_members = set(m.lower() for m in snapshot['trello'].get('token_members', []))
+
+    out = output.get()
+    drifted = 0
+    for kind, name in sorted(set(expected) | set(actual)):
+        record = actual.get((kind, name))
+        problems = []
+        if (kind, name) not in expected:
+            if kind == 'board' and record['closed']:
+                continue  # closed boards are archived
+            problems.append('not expected')
+        elif record is None:
+            problems.append('missing')
+        elif kind == 'team':
+            exp = expected[(kind, name)]
+            members = set(m.lower() for m in record['members'])
+            problems.extend(_difference('members', exp['members'], members))
+            problems.extend(_difference('repos', exp['repos'], set(record['repos'])))
+        elif kind == 'board':
+            exp = expected[(kind, name)]
+            if record['closed']:
+                problems.append('closed')
+            admins, members = [set(m.lower() for m in record[k]) for k in ['admins', 'members']]
+            problems.extend(_difference('admins', exp['admins'] - admins, set()))
+            problems.extend(_difference('members', exp['members'], members - (token_members - exp['members'])))
+            problems.extend(_difference('lists', set(exp['lists']) - set(record['lists']), set()))
+
+        message = "Checking %s '%s'" % ({'repo': 'repository'}.get(kind, kind), name)
+        if problems:
+            drifted += 1
+            out.done(name, 'check_%s' % kind, message, output.Reporter.FAILED, error='; '.join(problems))
+        else:
+            out.done(name, 'check_%s' % kind, message, output.Reporter.OK)
+    return drifted
+
+
+def _difference(label, expected, actual):
+    problems = []
+    if expected - actual:
+        problems.append('missing %s: %s' % (label, ', '.join(sorted(expected - actual))))
+    if actual - expected:
+        problems.append('unexpected %s: %s' % (label, ', '.join(sorted(actual - expected))))
+    return problems
+
+
+def report_changes(old, new):
+    """
+    Reports the changes between two snapshots. Resources with equal digests are not compared.
+    """
+    out = output.get()
+    old_digests, new_digests = old.get('digests', dict()), new.get('digests', dict())
+    changed = [key for key in sorted(set(old_digests) | set(new_digests))
+               if old_digests.get(key) != new_digests.get(key)]
+    out.info("Changes from snapshot '%s' to '%s': %d of %d resource(s)." % (
+        old['id'], new['id'], len(changed), len(new_digests)), 'cyan', attrs=['bold'])
+    if not changed:
+        return
+
+    old_view, new_view = view(old), view(new)
+    for key in changed:
+        kind, name = key.split(':', 1)
+        before, after = old_view.get((kind, name)), new_view.get((kind, name))
+        label = "%s '%s'" % ({'repo': 'Repository'}.get(kind, kind.capitalize()), name)
+        if before is None:
+            out.info("%s added." % label, 'green')
+        elif after is None:
+            out.info("%s removed." % label, 'red')
+        else:
+            changes = []
+            for field in sorted(after):
+                if isinstance(after[field], list):
+                    added, removed = set(after[field]) - set(before.get(field, [])), \
+                        set(before.get(field, [])) - set(after[field])
+                    changes.extend(['+%s: %s' % (field, ', '.join(sorted(added)))] if added else [])
+                    changes.extend(['-%s: %s' % (field, ', '.join(sorted(removed)))] if removed else [])
+                elif after[field] != before.get(field):
+                    changes.append('%s: %s' % (field, after[field]))
+            out.info("%s changed (%s)." % (label, '; '.join(changes)), 'yellow')
+
+
+class JsonSnapshotStore(object):
+    """
+    Stores each snapshot as a JSON file in a directory.
+    """
+
+    def __init__(self, path):
+        self.__path = path
+
+    def ids(self):
+        return sorted(os.path.basename(p)[:-len('.json')] for p in glob.glob(os.path.join(self.__path, '*.json')))
+
+    def load(self, snapshot_id):
+        try:
+            with open(os.path.join(self.__path, '%s.json' % snapshot_id), 'r') as f:
+                return json.load(f)
+        except IOError:
+            raise RuntimeError("Snapshot '%s' not found" % snapshot_id)
+        except ValueError as e:
+            raise RuntimeError("Cannot read snapshot '%s': %s" % (snapshot_id, e))
+
+    def save(self, snapshot):
+        if not os.path.isdir(self.__path):
+            os.makedirs(self.__path)
+        path = os.path.join(self.__path, '%s.json' % snapshot['id'])
+        if os.path.exists(path):
+            raise RuntimeError("Snapshot '%s' already exists" % snapshot['id'])
+        # write a temporary file first, so that an interrupted run cannot leave a truncated snapshot behind
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot, f, sort_keys=True, separators=(',', ':'))
+        os.rename(path + '.tmp', path)
+
+
+class SqliteSnapshotStore(object):
+    """
+    Stores each snapshot as a row of the 'snapshots' table of an SQLite database.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__connection = sqlite3.connect(path)
+        with self.__connection:
+            self.__connection.execute("CREATE TABLE IF NOT EXISTS snapshots "
+                                      "(id TEXT PRIMARY KEY, created TEXT NOT NULL, data TEXT NOT NULL)")
+
+    def ids(self):
+        return [i for i, in self.__connection.execute("SELECT id FROM snapshots ORDER BY id")]
+
+    def load(self, snapshot_id):
+        row = self.__connection.execute("SELECT data FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+        if row is None:
+            raise RuntimeError("Snapshot '%s' not found" % snapshot_id)
+        return json.loads(row[0])
+
+    def save(self, snapshot):
+        try:
+            with self.__connection:
+                self.__connection.execute("INSERT INTO snapshots (id, created, data) VALUES (?, ?, ?)",
+                                          (snapshot['id'], snapshot['created'],
+                                           json.dumps(snapshot, sort_keys=True, separators=(',', ':'))))
+        except sqlite3.IntegrityError:
+            raise RuntimeError("Snapshot '%s' already exists" % snapshot['id'])
+
+
+def store(path):
+    """
+    Returns the snapshot store at the given path (an SQLite database for *.db and *.sqlite files, else a directory).
+    """
+    path = os.path.expanduser(path)
+    if os.path.splitext(path)[1] in ['.db', '.sqlite']:
+        return SqliteSnapshotStore(path)
+    return JsonSnapshotStore(path)
@@ -18,6 +18,8 @@ Created on Apr 13, 2014
 
 from __future__ import absolute_import
 
+import os
+
 from cement.core import controller
 
 
@@ -28,11 +30,13 @@ class BaseController(controller.CementBaseController):
 
         config_section = 'core'
         config_defaults = dict(
-            # input format
+            # input format (users_source is one of 'csv', 'jsonl' and 'sqlite')
+            users_source='csv',
             users_file=None,
             users_file_skip_first=False,
             users_file_delimiter=';',
             users_file_escape_char=None,
+            users_table='users',
             # input schema
             users_schema='ID;Username;Group;Github;Trello',
             users_schema_key_id='ID',
@@ -40,8 +44,32 @@ class BaseController(controller.CementBaseController):
             users_schema_key_group='Group',
             users_schema_key_github='Github',
             users_schema_key_trello='Trello',
+            # roster fingerprints of the last successful runs (see '--changed-only')
+            state_file=os.path.join('~', '.scrum-tools', 'state.json'),
+            # output format of the operations (see '--report')
+            report_format='text',
+            # HTTP traffic recording and replay (see '--record' and '--replay')
+            http_record=None,
+            http_replay=None,
+            http_replay_latency=1.0,
+            # GET responses are cached for the duration of a run (see cache.RequestCache)
+            http_cache=True,
         )
 
     @controller.expose(hide=True)
     def default(self):
-        self.app.args.parse_args(['--help'])
\ No newline at end of file
+        self.app.args.parse_args(['--help'])
+
+
+def normalize_config(config):
+    """
+    Converts the list-valued config parameters given as ';'-separated strings into lists.
+    """
+    # make sure that 'core.users_schema' is a list
+    schema = config.get('core', 'users_schema')
+    schema = [x.strip() for x in schema.split(';')] if isinstance(schema, str) else schema
+    config.set('core', 'users_schema', schema)
+    # make sure that 'trello.board_lists' is a list
+    board_lists = config.get('trello', 'board_lists')
+    board_lists = [x.strip() for x in board_lists.split(';')] if isinstance(board_lists, str) else board_lists
+    config.set('trello', 'board_lists', board_lists)
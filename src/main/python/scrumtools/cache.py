@@ -0,0 +1,224 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import copy
+import threading
+from urlparse import urlsplit, parse_qsl
+
+
+class RequestCache(object):
+    """
+    A run-scoped cache of GET responses.
+
+    Each remote resource is read at most once per run: the response of a GET request is kept until a related write is
+    made, and concurrent identical requests are coalesced into one (the callers wait for the first one and receive a
+    copy of its response). Only successful responses are kept.
+
+    Responses are related to the resources they depend on, identified by (host, collection, ID, sub-collection) tuples
+    taken from the URL path (e.g. '/teams/42/members' or '/1/boards/<id>/lists', including the URLs of Trello batch
+    requests). A write invalidates the responses of the resource it addresses and of the listings it changes (see
+    _affected()), e.g. deleting a repo invalidates the repo listings of its organization and of all teams, and
+    'POST /1/lists' invalidates the lists of its board. Responses are not specific to a credential, so the cache must
+    not be used for endpoints of the authenticated user.
+    """
+
+    WAIT_TIMEOUT = 24 * 3600  # waiting with a timeout keeps the main thread responsive to signals
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__entries = dict()  # key -> _Entry
+
+    def get(self, url, params, fetch, accept=None):
+        """
+        Returns the response of 'GET url' with the given query parameters, calling fetch() only if it is neither cached
+        nor already in flight.
+        """
+        if not self.enabled or _personal(url):
+            return fetch()
+
+        key = (url, tuple(sorted(dict(params or {}).items())), accept)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            leader = entry is None
+            if leader:
+                entry = self.__entries[key] = _Entry(_resources(url, params))
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not leader:
+            return copy.copy(entry.wait(self.WAIT_TIMEOUT))
+
+        try:
+            response = fetch()
+            response.content  # the content is read once and shared by all copies
+        except Exception as e:
+            self.__discard(key, entry)
+            entry.fail(e)
+            raise
+        if not response.ok:
+            self.__discard(key, entry)
+        entry.succeed(response)
+        return response
+
+    def invalidate(self, url, method=None, params=None):
+        """
+        Discards the cached responses related to a write with the given method and query parameters to the given URL.
+        """
+        patterns = _affected(url, method, params)
+        with self.__lock:
+            for key, entry in self.__entries.items():
+                if any(_matches(p, r) for p in patterns for r in entry.resources):
+                    del self.__entries[key]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries = dict()
+
+    def __discard(self, key, entry):
+        with self.__lock:
+            if self.__entries.get(key) is entry:
+                del self.__entries[key]
+
+
+class _Entry(object):
+    """
+    A cached or in-flight response.
+    """
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.__done = threading.Event()
+        self.__response = None
+        self.__error = None
+
+    def succeed(self, response):
+        self.__response = response
+        self.__done.set()
+
+    def fail(self, e):
+        self.__error = e
+        self.__done.set()
+
+    def wait(self, timeout):
+        self.__done.wait(timeout)
+        if self.__error is not None:
+            raise self.__error
+        return self.__response
+
+
+def _resource(url):
+    """
+    Returns the resource (host, collection, ID, sub-collection) addressed by the given URL. Missing parts are empty
+    (e.g. the ID of '/1/lists').
+    """
+    parts = urlsplit(url)
+    return _path_resource(parts.netloc, parts.path)
+
+
+def _path_resource(netloc, path):
+    segments = [s for s in path.split('/') if s]
+    if segments and segments[0].isdigit():  # API version (e.g. '/1/boards/<id>')
+        segments = segments[1:]
+    if segments and segments[0] == 'repos' and len(segments) > 2:  # GitHub repos are identified by ':owner/:repo'
+        segments[1:3] = ['%s/%s' % (segments[1], segments[2])]
+    segments += ['', '', '']
+    return netloc, segments[0], segments[1], segments[2]
+
+
+def _resources(url, params):
+    """
+    Returns the resources a GET response depends on (including the URLs of a Trello batch request).
+    """
+    resource = _resource(url)
+    resources = set([resource])
+    query = dict(parse_qsl(urlsplit(url).query))
+    query.update(params or {})
+    if resource[1] == 'batch' and query.get('urls'):
+        resources.update(_path_resource(resource[0], path) for path in query['urls'].split(','))
+    return resources
+
+
+def _affected(url, method=None, params=None):
+    """
+    Returns the patterns of the resources changed by a write to the given URL. A None part of a pattern matches any
+    value (see _matches()), an unknown board or list ID included.
+    """
+    netloc, collection, key, sub = _resource(url)
+    query = dict(parse_qsl(urlsplit(url).query))
+    query.update(params or {})
+    method = (method or '').upper()
+
+    # the addressed resource (with all its sub-collections), or the addressed collection
+    patterns = [(netloc, collection, key, None)]
+    # GitHub
+    if collection == 'orgs' and sub in ['repos', 'teams']:
+        # only the addressed listing of the organization; new repos and teams may be added to teams and repos
+        patterns = [(netloc, 'orgs', key, ''), (netloc, 'orgs', key, sub)]
+        patterns.append((netloc, 'teams', None, 'repos'))
+        patterns.append((netloc, 'repos', None, 'teams'))
+    elif collection == 'repos' and key:
+        # repo listings of the organization (or user) and of the teams
+        patterns.append((netloc, 'orgs', key.split('/')[0], 'repos'))
+        patterns.append((netloc, 'users', key.split('/')[0], 'repos'))
+        patterns.append((netloc, 'teams', None, 'repos'))
+    elif collection == 'teams' and key and (method == 'DELETE' and not sub or sub == 'repos'):
+        # team listings of the organization and of the repos
+        patterns.append((netloc, 'orgs', None, 'teams'))
+        patterns.append((netloc, 'repos', None, 'teams'))
+    # Trello (nested organization board reads include the lists and the members of the boards)
+    elif collection == 'boards':
+        patterns.append((netloc, 'organizations', None, 'boards'))
+    elif collection == 'lists' and not key:
+        patterns.append((netloc, 'boards', query.get('idBoard'), 'lists'))
+        patterns.append((netloc, 'organizations', None, 'boards'))
+    elif collection == 'cards' and not key:
+        patterns.append((netloc, 'lists', query.get('idList'), None))
+        patterns.append((netloc, 'boards', None, 'cards'))
+    return patterns
+
+
+def _matches(pattern, resource):
+    # a single resource (e.g. '/1/boards/<id>') depends on all of its sub-collections
+    return all(p is None or p == r for p, r in zip(pattern[:3], resource[:3])) and \
+        (pattern[3] is None or pattern[3] == resource[3] or not resource[3] and pattern[2] is not None)
+
+
+def _personal(url):
+    # endpoints of the authenticated user (GitHub '/user', Trello '/1/members/me')
+    _, collection, key, _ = _resource(url)
+    return collection == 'user' or collection == 'members' and key == 'me'
+
+
+_cache = RequestCache()
+
+
+def configure(enabled=True):
+    """
+    Starts a new run (all cached responses are discarded).
+    """
+    _cache.clear()
+    _cache.enabled = enabled
+
+
+def get():
+    return _cache
@@ -0,0 +1,199 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import os
+import glob
+import time
+from multiprocessing.pool import ThreadPool
+
+from cement.core import controller, handler
+
+from scrumtools import base, data, error, output, provision, scheduler, state, transport
+
+
+class CoursesController(controller.CementBaseController):
+    class Meta:
+        label = 'courses'
+        interface = controller.IController
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        description = "Provisions several courses (one config file per course) in parallel (other commands have " \
+                      "to be run once per course config)."
+
+        config_section = 'courses'
+        config_defaults = dict(
+            config_dir=None,
+            jobs=4,
+        )
+
+        arguments = [
+            (['-c', '--config'],
+             dict(action='append', metavar='FILE', dest='course_configs', default=[],
+                  help='the config file of a course (can be given multiple times)')),
+            (['-d', '--config-dir'],
+             dict(action='store', metavar='DIR', dest='config_dir',
+                  help='a directory with one config file (*.conf) per course')),
+            (['-J', '--jobs'],
+             dict(action='store', metavar='N', dest='jobs', type=int,
+                  help='maximum number of courses processed concurrently')),
+            (['-N', '--changed-only'],
+             dict(action='store_true', dest='changed_only',
+                  help='only provision the groups that changed since the last successful run')),
+            output.ARGUMENT,
+        ] + transport.ARGUMENTS
+
+    WAIT_TIMEOUT = 24 * 3600  # waiting with a timeout keeps the main thread responsive to signals
+
+    @controller.expose(hide=True)
+    def default(self):
+        self.app.args.parse_args(['--help'])
+
+    @controller.expose(help="Provisions GitHub and Trello for several courses in parallel.")
+    def provision(self):
+        self.app.log.debug('Provisioning several courses.')
+
+        # read the course configs (the app config provides the defaults)
+        courses = []
+        shared = dict()
+        for label, path in self.__config_files():
+            config = self.__course_config(path)
+            self.__validate(label, config)
+            # courses with the same credentials share the credential pools (and their quota) and the API sessions
+            courses.append((label, config, provision.Provisioner(config, shared=shared)))
+
+        def run(course):
+            label, config, provisioner = course
+            start = time.time()
+            try:
+                return label, self.__provision(label, config, provisioner), None, time.time() - start
+            except (RuntimeError, IOError, ValueError) as e:
+                return label, None, e, time.time() - start
+
+        start = time.time()
+        workers = ThreadPool(max(1, min(int(self.app.config.get('courses', 'jobs')), len(courses))))
+        try:
+            results = [workers.apply_async(run, (course,)) for course in courses]
+            results = [result.get(self.WAIT_TIMEOUT) for result in results]
+        finally:
+            workers.close()
+            workers.join()
+            for client in set(provisioner.trello_client for _, _, provisioner in courses):
+                client.close()
+
+        self.__summary(results, time.time() - start)
+
+        pools = []
+        for _, _, provisioner in courses:
+            for pool in [provisioner.github_pool, provisioner.trello_client.credentials]:
+                if pool not in pools:
+                    pools.append(pool)
+        for pool in pools:
+            for line in pool.report():
+                if len(pool) > 1:
+                    output.get().info(line, 'cyan')
+                else:
+                    self.app.log.debug(line)
+
+    def __provision(self, label, config, provisioner):
+        """
+        Provisions one course and returns the number of OK, failed and skipped tasks (or None if it was unchanged).
+        """
+        user_repository = data.UserRepository(config)
+
+        # restrict the run to the groups changed since the last successful run
+        roster_state = state.RosterState(config.get('core', 'state_file'))
+        scope = state.scope(config, 'provision')
+        settings = provisioner.settings()
+        fingerprints = user_repository.fingerprints()
+        changed = None
+        if self.app.pargs.changed_only:
+            changed = roster_state.changed(scope, settings, fingerprints)
+            if not changed:
+                return None
+
+        # the courses report concurrently, so the lines are prefixed with the course
+        report = lambda task, status, e: provision.report(task, status, e, label)
+        status = provisioner.run(user_repository, changed, report)
+        counts = [status.values().count(s) for s in [scheduler.TaskGraph.OK, scheduler.TaskGraph.FAILED,
+                                                     scheduler.TaskGraph.SKIPPED]]
+
+        # record the roster only if all changes were applied
+        if not counts[1] and not counts[2]:
+            roster_state.save(scope, settings, fingerprints)
+        return counts
+
+    def __config_files(self):
+        paths = list(self.app.pargs.course_configs)
+        config_dir = self.app.config.get('courses', 'config_dir')
+        if config_dir:
+            config_dir = os.path.expanduser(config_dir)
+            if not os.path.isdir(config_dir):
+                raise error.ConfigError("Config directory '%s' not found" % config_dir)
+            paths.extend(sorted(glob.glob(os.path.join(config_dir, '*.conf'))))
+        if not paths:
+            raise error.ConfigError("No course configs given! Please set a '--config' or '--config-dir' option value!")
+
+        labels = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+        # fall back to the paths as labels if the file names are ambiguous
+        if len(set(labels)) < len(labels):
+            labels = paths
+        return zip(labels, paths)
+
+    def __course_config(self, path):
+        # a fresh handler of the app's config handler type (it only parses and merges, so it needs no app setup)
+        config = handler.get('config', self.app.config.Meta.label)()
+        if not config.parse_file(path):
+            raise error.ConfigError("Config file '%s' not found" % path)
+        # the app config provides the parameters which are not set in the course config (merged after parsing, as
+        # parsing would join the already normalized list values)
+        for section in self.app.config.get_sections():
+            config.merge({section: self.app.config.get_section_dict(section)}, override=False)
+        base.normalize_config(config)
+        return config
+
+    @staticmethod
+    def __validate(label, config):
+        if not config.get('core', 'users_file'):
+            raise error.ConfigError("Missing config parameter 'core.users_file' for course '%s'!" % label)
+        if not config.get('github', 'auth_token') or not config.get('github', 'auth_id'):
+            raise error.ConfigError("Missing config parameter 'github.auth_id' and/or 'github.auth_token' for course "
+                                    "'%s'! Please run 'scrum-tools github authorize' first! " % label)
+        if not config.get('trello', 'auth_key') or not config.get('trello', 'auth_token'):
+            raise error.ConfigError("Missing config parameter 'trello.auth_key' and/or 'trello.auth_token' for course "
+                                    "'%s'! Please run 'scrum-tools trello authorize' first! " % label)
+
+    @staticmethod
+    def __summary(results, elapsed):
+        out = output.get()
+        width = max([len(label) for label, _, _, _ in results] + [len('Course')])
+        out.info("%-*s %8s %8s %8s %9s" % (width, 'Course', 'OK', 'Not OK', 'Skipped', 'Time'), None, attrs=['bold'])
+        for label, counts, e, duration in results:
+            if e is not None:
+                out.info("%-*s %s" % (width, label, 'Error: %s' % e), 'red')
+            elif counts is None:
+                out.info("%-*s %26s %8.1fs" % (width, label, '(unchanged)', duration), 'yellow')
+            else:
+                out.info("%-*s %8d %8d %8d %8.1fs" % ((width, label) + tuple(counts) + (duration,)),
+                         'green' if not counts[1] and not counts[2] else 'red')
+
+        sequential = sum(duration for _, _, _, duration in results)
+        failed = len([e for _, counts, e, _ in results if e is not None or counts and (counts[1] or counts[2])])
+        out.info("%d course(s) finished in %.1fs (%.1fs in total), %d with errors." % (
+            len(results), elapsed, sequential, failed), 'green' if not failed else 'red', attrs=['bold'])
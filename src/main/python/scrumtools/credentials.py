@@ -0,0 +1,123 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+
+class Credential(object):
+    """
+    An API credential together with the request quota observed for it.
+    """
+
+    def __init__(self, token, key=None):
+        self.token = token
+        self.key = key
+        self.requests = 0
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+
+    @property
+    def label(self):
+        return '...%s' % self.token[-4:]
+
+
+class CredentialPool(object):
+    """
+    A pool of credentials for one backend.
+
+    Each request acquires the credential with the largest remaining quota (credentials without an observed quota are
+    preferred, then the least used ones). The quota is updated from the rate limit headers of the response.
+    """
+
+    def __init__(self, credentials, limit_header, remaining_header, reset_header=None):
+        if not credentials:
+            raise ValueError("Empty credential pool")
+
+        self.__credentials = list(credentials)
+        self.__limit_header = limit_header
+        self.__remaining_header = remaining_header
+        self.__reset_header = reset_header
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__credentials)
+
+    def __iter__(self):
+        return iter(self.__credentials)
+
+    def acquire(self):
+        with self.__lock:
+            credential = max(self.__credentials,
+                             key=lambda c: (c.remaining if c.remaining is not None else float('inf'), -c.requests))
+            credential.requests += 1
+            if credential.remaining is not None:
+                credential.remaining -= 1
+            return credential
+
+    def update(self, credential, headers):
+        with self.__lock:
+            if self.__limit_header in headers:
+                credential.limit = int(headers[self.__limit_header])
+            if self.__remaining_header in headers:
+                credential.remaining = int(headers[self.__remaining_header])
+            if self.__reset_header and self.__reset_header in headers:
+                credential.reset = int(headers[self.__reset_header])
+
+    def report(self):
+        """
+        Returns one line per credential describing its usage and remaining quota.
+        """
+        lines = []
+        for c in self.__credentials:
+            quota = '%d/%d remaining' % (c.remaining, c.limit) if c.remaining is not None and c.limit else \
+                'unknown quota'
+            lines.append("Token '%s': %d requests, %s" % (c.label, c.requests, quota))
+        return lines
+
+
+def github_pool(config):
+    tokens = [config.get('github', 'auth_token')] + split(config.get('github', 'auth_token_pool'))
+    return CredentialPool([Credential(t) for t in unique(tokens)],
+                          'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset')
+
+
+def trello_pool(config):
+    """
+    Entries of the 'trello.auth_token_pool' list are either tokens for 'trello.auth_key' or 'key:token' pairs.
+    """
+    auth_key = config.get('trello', 'auth_key')
+    entries = [config.get('trello', 'auth_token')] + split(config.get('trello', 'auth_token_pool'))
+    return CredentialPool([Credential(e.split(':', 1)[-1], e.split(':', 1)[0] if ':' in e else auth_key)
+                           for e in unique(entries)],
+                          'x-rate-limit-api-token-max', 'x-rate-limit-api-token-remaining')
+
+
+def split(value):
+    if not value:
+        return []
+    if isinstance(value, basestring):
+        value = value.split(';')
+    return [v.strip() for v in value if v.strip()]
+
+
+def unique(values):
+    seen = set()
+    return [v for v in values if v and not (v in seen or seen.add(v))]
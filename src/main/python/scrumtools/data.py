@@ -18,10 +18,18 @@ Created on Apr 13, 2014
 
 from __future__ import absolute_import
 
+import os
 import csv
+import json
+import errno
 import codecs
+import hashlib
+import sqlite3
+import threading
 import cStringIO
 
+from scrumtools import error
+
 
 class UTF8Recoder:
     """
@@ -87,56 +95,249 @@ class UnicodeWriter:
 
 
 class UserRepository:
+    """
+    The users of a course, read from the roster source selected by 'core.users_source' (see SOURCES).
+    """
+
     def __init__(self, config):
-        # CSV file config
-        self.__file = config.get('core', 'users_file')
-        self.__file_delimiter = config.get('core', 'users_file_delimiter')
-        self.__file_quotechar = config.get('core', 'users_file_escape_char')
-        self.__file_skip_first = config.getboolean('core', 'users_file_skip_first')
-        # CSV schema config
-        self.__schema = config.get('core', 'users_schema')
+        source = config.get('core', 'users_source')
+        if source not in SOURCES:
+            raise error.ConfigError("Invalid users source '%s' (expected one of %s)" % (
+                source, ', '.join(sorted(SOURCES))))
+
+        # schema config
         self.__key_group = config.get('core', 'users_schema_key_group')
         self.__key_id = config.get('core', 'users_schema_key_id')
         self.__key_username = config.get('core', 'users_schema_key_username')
         self.__key_github = config.get('core', 'users_schema_key_github')
         self.__key_trello = config.get('core', 'users_schema_key_trello')
 
-        # sanitize input
-        self.__file_quotechar = self.__file_quotechar if self.__file_quotechar else None
-        self.__file_delimiter = self.__file_delimiter if self.__file_delimiter else None
-
-        # read users from CSV file
-        self.__users = [u for u in self.__read()]
-        self.__users.sort(key=lambda x: x[self.__key_group])
-
-        # create groups
-        self.__groups = ["%d" % g for g in sorted(set([int(u[self.__key_group]) for u in self.__users if int(u[self.__key_group]) != '']))]
+        self.__source = SOURCES[source](config)
 
     def users(self, f=None):
-        for u in self.__users:
+        for u in self.__source.users():
             if not f:
                 yield u
             elif f(u):
                 yield u
 
     def groups(self):
-        for g in self.__groups:
+        for g in self.__source.groups():
             yield g
 
-    def __read(self):
-        with open(self.__file, 'rb') as f:
+    def members(self, group):
+        for u in self.__source.members(group):
+            yield u
+
+    def accounts(self, key, group=None):
+        """
+        Returns the set of values of the given schema key (e.g. the GitHub accounts) of all users or of the members of
+        the given group.
+        """
+        return self.__source.accounts(key, group)
+
+    def fingerprints(self):
+        """
+        Returns a dict that maps each group to a hash of the IDs, usernames and account names of its members.
+
+        The members are read group by group, so that only the members of one group are held in memory at a time.
+        """
+        keys = [self.__key_id, self.__key_username, self.__key_github, self.__key_trello]
+        fingerprint = lambda members: hashlib.sha1(u'\n'.join(sorted(members)).encode('utf-8')).hexdigest()
+        return dict((g, fingerprint(u'\t'.join(u[k] for k in keys) for u in self.__source.members(g)))
+                    for g in self.__source.groups())
+
+
+class _MemorySource(object):
+    """
+    A roster source that reads all users into memory and indexes them by group.
+
+    The users are read by the given callable, which returns an iterator over the users (dicts) of the given file.
+    """
+
+    def __init__(self, config, read):
+        self.schema = config.get('core', 'users_schema')
+        self.key_group = config.get('core', 'users_schema_key_group')
+
+        self.__users = [u for u in read(config.get('core', 'users_file'))]
+        self.__users.sort(key=lambda x: x[self.key_group])
+
+        # index users by group
+        self.__members = dict()
+        for u in self.__users:
+            self.__members.setdefault("%d" % int(u[self.key_group]), []).append(u)
+        self.__groups = ["%d" % g for g in sorted(set(int(g) for g in self.__members))]
+
+    def users(self):
+        return iter(self.__users)
+
+    def groups(self):
+        return iter(self.__groups)
+
+    def members(self, group):
+        return iter(self.__members.get("%d" % int(group), []))
+
+    def accounts(self, key, group=None):
+        return set(u[key] for u in (self.users() if group is None else self.members(group)))
+
+
+class CsvSource(_MemorySource):
+    """
+    Reads the users from a delimited file (one user per line, with the fields given by 'core.users_schema').
+    """
+
+    def __init__(self, config):
+        self.__delimiter = config.get('core', 'users_file_delimiter') or None
+        self.__quotechar = config.get('core', 'users_file_escape_char') or None
+        self.__skip_first = config.getboolean('core', 'users_file_skip_first')
+        super(CsvSource, self).__init__(config, self.__read)
+
+    def __read(self, path):
+        with open(path, 'rb') as f:
             reader = UnicodeReader(f, encoding='utf-8',
-                                   delimiter=self.__file_delimiter,
-                                   quoting=csv.QUOTE_NONE if not self.__file_quotechar else csv.QUOTE_MINIMAL,
-                                   quotechar=self.__file_quotechar,
+                                   delimiter=self.__delimiter,
+                                   quoting=csv.QUOTE_NONE if not self.__quotechar else csv.QUOTE_MINIMAL,
+                                   quotechar=self.__quotechar,
                                    skipinitialspace=True)
 
-            if self.__file_skip_first:
+            if self.__skip_first:
                 next(reader)
 
             for user in reader:
-                if len(user) - len(self.__schema) == 1 and not user[-1]:
+                if len(user) - len(self.schema) == 1 and not user[-1]:
                     user = user[:-1]
-                if len(user) - len(self.__schema) != 0:
-                    raise ValueError("Expected CSV line with %d entries, got %d" % (len(self.__schema), len(user)))
-                yield dict(zip(self.__schema, [field.strip() for field in user]))
\ No newline at end of file
+                if len(user) - len(self.schema) != 0:
+                    raise ValueError("Expected CSV line with %d entries, got %d" % (len(self.schema), len(user)))
+                yield dict(zip(self.schema, [field.strip() for field in user]))
+
+
+class JsonLinesSource(_MemorySource):
+    """
+    Reads the users from a JSON lines file (one object per line, with the keys given by 'core.users_schema').
+    """
+
+    def __init__(self, config):
+        super(JsonLinesSource, self).__init__(config, self.__read)
+
+    def __read(self, path):
+        with open(path, 'rb') as f:
+            for i, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    user = json.loads(line)
+                except ValueError as e:
+                    raise ValueError("Invalid JSON object in line %d (%s)" % (i + 1, e))
+                if not isinstance(user, dict):
+                    raise ValueError("Expected JSON object in line %d, got %s" % (i + 1, type(user).__name__))
+                yield dict((k, _text(user.get(k))) for k in self.schema)
+
+
+class SqliteSource(object):
+    """
+    Reads the users from a table of an SQLite database (one row per user, with the columns given by
+    'core.users_schema').
+
+    The rows are not loaded into memory: the groups, the members of a group and the accounts are queried on demand,
+    using indexes on the group and the account columns (which are created if missing and the database is writable),
+    and the result rows are streamed in chunks of FETCH_SIZE. The group column must hold integers (or integer strings),
+    which are compared by their numeric value; rows with other groups (e.g. NULL or empty) are rejected when the source
+    is opened, as CAST would map them to group 0.
+    """
+
+    FETCH_SIZE = 256
+
+    def __init__(self, config):
+        path = os.path.expanduser(config.get('core', 'users_file'))
+        if not os.path.isfile(path):
+            raise IOError(errno.ENOENT, "No such file", path)
+
+        self.__schema = config.get('core', 'users_schema')
+        self.__table = config.get('core', 'users_table')
+        # compare groups by value, as in the in-memory sources ('02' and 2 are the same group)
+        self.__group = 'CAST(%s AS INTEGER)' % _identifier(config.get('core', 'users_schema_key_group'))
+        self.__columns = ', '.join(_identifier(c) for c in self.__schema)
+        self.__lock = threading.Lock()
+        # the repository may be used by other threads than the one that created it (e.g. 'courses provision')
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+
+        # (index name suffix, indexed expression); the group index matches the CAST in the group queries
+        indexed = [('%s_int' % config.get('core', 'users_schema_key_group'), self.__group),
+                   (config.get('core', 'users_schema_key_github'),
+                    _identifier(config.get('core', 'users_schema_key_github'))),
+                   (config.get('core', 'users_schema_key_trello'),
+                    _identifier(config.get('core', 'users_schema_key_trello')))]
+        try:
+            with self.__connection:
+                for name, expression in indexed:
+                    self.__connection.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (
+                        _identifier('%s_%s_idx' % (self.__table, name)), _identifier(self.__table), expression))
+        except sqlite3.OperationalError:
+            pass  # read-only database (or missing table, which is reported by the first query)
+
+        # reject the groups that are not integers, as the CSV and JSON lines sources do
+        key_id = _identifier(config.get('core', 'users_schema_key_id'))
+        key_group = _identifier(config.get('core', 'users_schema_key_group'))
+        for user_id, group in self.__query(
+                "SELECT %s, %s FROM %s WHERE %s IS NULL OR TRIM(%s) = '' OR TRIM(%s) GLOB '*[^0-9]*' LIMIT 1" % (
+                    key_id, key_group, _identifier(self.__table), key_group, key_group, key_group), columns=2):
+            raise ValueError("Invalid group '%s' of user '%s' in the users table '%s' (expected an integer)" % (
+                group, user_id, self.__table))
+
+    def users(self):
+        return self.__query("SELECT %s FROM %s ORDER BY %s" % (
+            self.__columns, _identifier(self.__table), self.__group))
+
+    def groups(self):
+        rows = self.__query("SELECT DISTINCT %s FROM %s ORDER BY %s" % (
+            self.__group, _identifier(self.__table), self.__group), columns=1)
+        return ("%d" % int(g) for g, in rows)
+
+    def members(self, group):
+        return self.__query("SELECT %s FROM %s WHERE %s = ?" % (
+            self.__columns, _identifier(self.__table), self.__group), (int(group),))
+
+    def accounts(self, key, group=None):
+        sql = "SELECT DISTINCT %s FROM %s" % (_identifier(key), _identifier(self.__table))
+        if group is None:
+            return set(a for a, in self.__query(sql, columns=1))
+        return set(a for a, in self.__query(sql + " WHERE %s = ?" % self.__group, (int(group),), columns=1))
+
+    def __query(self, sql, params=(), columns=None):
+        """
+        Returns a generator over the result rows (tuples if 'columns' is given, else dicts keyed by the schema).
+        """
+        # execute eagerly, so that errors are raised by the call rather than by the first next()
+        cursor = self.__execute(lambda: self.__connection.execute(sql, params))
+
+        def rows():
+            while True:
+                chunk = self.__execute(lambda: cursor.fetchmany(self.FETCH_SIZE))
+                if not chunk:
+                    break
+                for row in chunk:
+                    if columns is not None:
+                        yield tuple(_text(v) for v in row)
+                    else:
+                        yield dict(zip(self.__schema, [_text(v) for v in row]))
+
+        return rows()
+
+    def __execute(self, fn):
+        try:
+            with self.__lock:
+                return fn()
+        except sqlite3.Error as e:
+            raise ValueError("Cannot read the users table '%s' (%s)" % (self.__table, e))
+
+
+# roster sources by 'core.users_source' value
+SOURCES = dict(csv=CsvSource, jsonl=JsonLinesSource, sqlite=SqliteSource)
+
+
+def _text(value):
+    return u'' if value is None else value.strip() if isinstance(value, unicode) else unicode(value).strip()
+
+
+def _identifier(name):
+    return '"%s"' % name.replace('"', '""')
@@ -0,0 +1,202 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import re
+import importlib
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+from scrumtools import error
+
+
+# DB-API modules for the supported URL schemes
+DRIVERS = {
+    'sqlite': 'sqlite3',
+    'postgres': 'psycopg2',
+    'postgresql': 'psycopg2',
+}
+
+# the smallest limit on the number of parameters of a statement among the drivers (SQLite before 3.32)
+MAX_PARAMETERS = 999
+
+COPY_PATTERN = re.compile(r'^COPY\s+([\w."]+)\s*\(([^)]*)\)\s+FROM\s+stdin;$', re.IGNORECASE)
+COPY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r'}
+
+# a portable version of the evaluation tool tables (for local stand-ins)
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS USERS (username VARCHAR(50) NOT NULL PRIMARY KEY, "
+    "password VARCHAR(50) NOT NULL, enabled BOOLEAN NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS GROUPS (id BIGINT NOT NULL PRIMARY KEY, "
+    "group_name VARCHAR(50) NOT NULL, course_id BIGINT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS GROUP_AUTHORITIES (group_id BIGINT NOT NULL REFERENCES GROUPS(id), "
+    "authority VARCHAR(50) NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS GROUP_MEMBERS (group_id BIGINT NOT NULL REFERENCES GROUPS(id), "
+    "username VARCHAR(50) NOT NULL)",
+]
+
+
+class Database(object):
+    """
+    A DB-API connection to the evaluation tool database, given as an URL (e.g. 'postgresql://user@host/evaltool' or
+    'sqlite:///evaltool.db').
+
+    All statements are executed in a single transaction, which is committed when the database is used as a context
+    manager and the block completes without an exception (and rolled back otherwise).
+    """
+
+    def __init__(self, url, batch_size=1000):
+        scheme = urlparse(url).scheme if url else None
+        if scheme not in DRIVERS:
+            raise error.ConfigError("Invalid database URL '%s' (supported schemes are %s)" % (
+                url, ', '.join(sorted(DRIVERS))))
+
+        try:
+            self.__driver = importlib.import_module(DRIVERS[scheme])
+        except ImportError:
+            raise error.ConfigError("Missing DB-API module '%s' for database URL '%s'" % (DRIVERS[scheme], url))
+
+        if scheme == 'sqlite':
+            # 'sqlite:///relative/path.db', 'sqlite:////absolute/path.db' or 'sqlite://' (in-memory)
+            path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else ''
+            self.__connection = self.__driver.connect(path or ':memory:')
+        else:
+            self.__connection = self.__driver.connect(url)
+
+        # psycopg2 runs executemany() row by row, whereas execute_values() sends multi-row statements
+        try:
+            self.__execute_values = importlib.import_module('psycopg2.extras').execute_values \
+                if DRIVERS[scheme] == 'psycopg2' else None
+        except (ImportError, AttributeError):
+            self.__execute_values = None
+
+        self.Error = self.__driver.Error
+        self.__placeholder = '?' if self.__driver.paramstyle == 'qmark' else '%s'
+        self.__batch_size = max(1, int(batch_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.__connection.commit()
+            else:
+                self.__connection.rollback()
+        finally:
+            self.__connection.close()
+        return False
+
+    def create_tables(self):
+        cursor = self.__connection.cursor()
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+    def query(self, statement):
+        cursor = self.__connection.cursor()
+        cursor.execute(statement)
+        return cursor.fetchall()
+
+    def select(self, table, columns, key, values):
+        """
+        Returns the given columns of the rows whose key column holds one of the given values (queried in batches of
+        at most batch_size values).
+        """
+        values = list(values)
+        size = min(self.__batch_size, MAX_PARAMETERS)
+        cursor = self.__connection.cursor()
+        rows = []
+        for i in range(0, len(values), size):
+            batch = values[i:i + size]
+            cursor.execute("SELECT %s FROM %s WHERE %s IN (%s)" % (
+                ', '.join(columns), table, key, ', '.join([self.__placeholder] * len(batch))), batch)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def insert(self, table, columns, rows):
+        """
+        Inserts the given rows in batches of at most batch_size rows and returns the number of inserted rows.
+        """
+        statement = "INSERT INTO %s(%s) VALUES " % (table, ', '.join(columns))
+        cursor = self.__connection.cursor()
+        count = 0
+        for i in range(0, len(rows), self.__batch_size):
+            batch = rows[i:i + self.__batch_size]
+            if self.__execute_values:
+                self.__execute_values(cursor, statement + '%s', batch, page_size=self.__batch_size)
+            else:
+                cursor.executemany(statement + '(%s)' % ', '.join([self.__placeholder] * len(columns)), batch)
+            count += len(batch)
+        return count
+
+    def update(self, table, columns, keys, rows):
+        """
+        Sets the given columns of the rows identified by the given keys. Each row holds the column values followed by
+        the key values.
+        """
+        return self.__execute("UPDATE %s SET %s WHERE %s" % (table, self.__conditions(columns, ', '),
+                                                             self.__conditions(keys, ' AND ')), rows)
+
+    def delete(self, table, keys, rows):
+        """
+        Deletes the rows identified by the given key values.
+        """
+        return self.__execute("DELETE FROM %s WHERE %s" % (table, self.__conditions(keys, ' AND ')), rows)
+
+    def __conditions(self, columns, separator):
+        return separator.join('%s = %s' % (c, self.__placeholder) for c in columns)
+
+    def __execute(self, statement, rows):
+        cursor = self.__connection.cursor()
+        for i in range(0, len(rows), self.__batch_size):
+            cursor.executemany(statement, rows[i:i + self.__batch_size])
+        return len(rows)
+
+
+def read_dump(path):
+    """
+    Reads the table data of a dump in COPY text format (e.g. a plain pg_dump or 'evaltool dump-sql-* --format=copy').
+
+    Returns a dict that maps upper-case table names to (columns, rows) tuples, where the row values are strings or None.
+    """
+    tables = dict()
+    rows = None
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.decode('utf-8').rstrip('\r\n')
+            if rows is None:
+                match = COPY_PATTERN.match(line)
+                if match:
+                    table = match.group(1).split('.')[-1].strip('"').upper()
+                    columns = [c.strip().strip('"').lower() for c in match.group(2).split(',')]
+                    rows = tables.setdefault(table, (columns, []))[1]
+            elif line == '\\.':
+                rows = None
+            else:
+                rows.append([copy_unescape(v) for v in line.split('\t')])
+    return tables
+
+
+def copy_unescape(value):
+    if value == '\\N':
+        return None
+    return re.sub(r'\\(.)', lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), value)
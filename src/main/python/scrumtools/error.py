@@ -18,4 +18,12 @@ Created on Apr 13, 2014
 
 
 class ConfigError(RuntimeError):
-    pass
\ No newline at end of file
+    pass
+
+
+class TaskError(RuntimeError):
+    pass
+
+
+class GitError(RuntimeError):
+    pass
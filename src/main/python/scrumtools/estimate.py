@@ -0,0 +1,322 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from requests.exceptions import RequestException
+
+from scrumtools import credentials, error, githubapi, trelloapi
+
+
+PAGE_SIZE = 100  # number of items per page of GitHub list responses
+TRELLO_DEFAULT_LISTS = ['To Do', 'Doing', 'Done']  # lists of a newly created Trello board
+WAIT_TIMEOUT = 24 * 3600  # waiting with a timeout keeps the main thread responsive to signals
+
+
+class Estimate(object):
+    """
+    The predicted number of read and write API calls of a run, per endpoint.
+
+    Rate limits are either hourly quotas (GitHub) or quotas that are replenished every `window` seconds (Trello).
+    Calls that are not rate limited (e.g. git operations) are reported without a credential pool. Calls that cannot be
+    predicted from the fetched state are described by notes.
+    """
+
+    def __init__(self, backend, concurrency, window=None):
+        self.backend = backend
+        self.concurrency = max(1, int(concurrency))
+        self.window = window
+        self.latency = None
+        self.upper_bound = False
+        self.notes = []
+        self.calls = OrderedDict()
+
+    def add(self, endpoint, reads=0, writes=0):
+        if reads or writes:
+            r, w = self.calls.get(endpoint, (0, 0))
+            self.calls[endpoint] = (r + reads, w + writes)
+
+    @property
+    def reads(self):
+        return sum(r for r, _ in self.calls.values())
+
+    @property
+    def writes(self):
+        return sum(w for _, w in self.calls.values())
+
+    def report(self, pool):
+        """
+        Returns the estimate compared against the quota of the given CredentialPool (if any) as (line, color) tuples.
+        """
+        total = self.reads + self.writes
+        lines = [("%s %s%s:" % (self.backend, 'calls' if pool is None else 'API calls',
+                                ' (upper bound)' if self.upper_bound else ''), 'green')]
+        for endpoint, (r, w) in self.calls.items():
+            lines.append(("  %-45s %6d reads %6d writes" % (endpoint, r, w), 'green'))
+        lines.append(("  %-45s %6d reads %6d writes" % ('total', self.reads, self.writes), 'green'))
+        lines.extend(("  Note: %s" % note, 'yellow') for note in self.notes)
+
+        known = [c for c in pool or [] if c.remaining is not None]
+        remaining = sum(c.remaining for c in known)
+        wall_time = total * (self.latency or 0) / self.concurrency
+
+        if pool is None:
+            lines.append(("Estimated wall time: %s at %d concurrent calls (not rate limited)." % (
+                duration(wall_time), self.concurrency), 'green'))
+        elif self.window:
+            limit = sum(c.limit for c in known if c.limit)
+            if limit:
+                wall_time = max(wall_time, float(total) / limit * self.window)
+            lines.append(("Estimated wall time: %s at %d concurrent requests." % (
+                duration(wall_time), self.concurrency), 'green'))
+        elif not known:
+            lines.append(("Estimated wall time: %s at %d concurrent requests (remaining quota unknown)." % (
+                duration(wall_time), self.concurrency), 'yellow'))
+        else:
+            reset = max(c.reset for c in known if c.reset) if any(c.reset for c in known) else None
+            at = " (resets at %s)" % time.strftime('%H:%M', time.localtime(reset)) if reset else ''
+            lines.append(("Estimated wall time: %s at %d concurrent requests, remaining quota: %d calls%s." % (
+                duration(wall_time), self.concurrency, remaining, at), 'green'))
+            if total > remaining:
+                lines.append(("The run exceeds the remaining quota! Split it or run it after the quota reset%s." % at,
+                              'red'))
+            elif total > 0.9 * remaining:
+                lines.append(("The run uses up almost all of the remaining quota%s." % at, 'yellow'))
+
+        return lines
+
+
+def duration(seconds):
+    return '%dm%02ds' % divmod(int(round(seconds)), 60)
+
+
+def pages(n):
+    return max(1, (n + PAGE_SIZE - 1) // PAGE_SIZE)
+
+
+def github(config, user_repository, commands, concurrency=1, changed=None):
+    """
+    Fetches the GitHub organization state and the remaining quota and estimates the calls of the given commands,
+    issued with the given concurrency (the 'github' commands issue their calls one at a time), for all groups or only
+    the given changed groups (see ProvisionController).
+
+    Returns the estimate and the credential pool.
+    """
+    organization = config.get('github', 'organization')
+
+    pool = credentials.github_pool(config)
+    gh = githubapi.login(pool)
+
+    # fetch the organization state and measure the request latency on the way
+    start = time.time()
+    org = gh.organization(organization)
+    if not org:
+        raise RuntimeError("Organization '%s' not found" % organization)
+    teams = dict((t.name, t) for t in org.iter_teams())
+    repos = dict((r.name, r) for r in org.iter_repos())
+    latency = (time.time() - start) / max(1, sum(c.requests for c in pool))
+
+    githubapi.rate_limit(pool)
+
+    e = github_calls(config, user_repository, commands, teams, repos, concurrency, changed)
+    e.latency = latency
+    return e, pool
+
+
+def github_calls(config, user_repository, commands, teams, repos, concurrency=1, changed=None):
+    """
+    Estimates the GitHub calls of the given commands for the given organization teams and repos (for all groups or
+    only the given changed groups).
+    """
+    # schema keys
+    key_github = config.get('core', 'users_schema_key_github')
+    # teams setup
+    team_admins = config.get('github', 'team_admins')
+    team_admins_group = config.get('github', 'team_admins_group')
+    team_users = config.get('github', 'team_users')
+    team_pattern = config.get('github', 'team_pattern')
+    # repos setup
+    repo_admins = config.get('github', 'repo_admins')
+    repo_users = config.get('github', 'repo_users')
+    repo_pattern = config.get('github', 'repo_pattern')
+
+    groups = [g for g in user_repository.groups() if changed is None or g in changed]
+    group_repos = [(repo_pattern % int(g), [team_pattern % int(g), team_admins]) for g in groups]
+    repo_specs = group_repos + [(repo_admins, [team_admins]), (repo_users, [team_admins, team_users])]
+    accounts = lambda group: set(a for a in user_repository.accounts(key_github, group) if a)
+    # (name, expected members) of the teams, the members of the admins team are only synchronized if they changed
+    team_specs = [(team_pattern % int(g), accounts(g)) for g in groups]
+    team_specs.append((team_admins, accounts(team_admins_group)
+                       if changed is None or '%d' % int(team_admins_group) in changed else None))
+    team_specs.append((team_users, accounts(None)))
+
+    e = Estimate('GitHub', concurrency)
+    e.add('GET /orgs/:org', reads=1)
+    e.add('GET /orgs/:org/teams', reads=pages(len(teams)))
+    if 'create_repos' in commands or 'delete_repos' in commands:
+        e.add('GET /orgs/:org/repos', reads=pages(len(repos)))
+
+    if 'create_repos' in commands:
+        e.add('POST /orgs/:org/repos', writes=len([r for r, _ in repo_specs if r not in repos]))
+        e.add('PUT /teams/:id/repos/:owner/:repo',
+              writes=sum(len([t for t in ts if t in teams]) for _, ts in repo_specs))
+    if 'delete_repos' in commands:
+        e.add('DELETE /repos/:owner/:repo', writes=len([r for r, _ in repo_specs if r in repos]))
+    if 'create_teams' in commands:
+        e.add('POST /orgs/:org/teams', writes=len([t for t, _ in team_specs if t not in teams]))
+        e.add('GET /teams/:id/members', reads=sum(pages(len(ms)) for _, ms in team_specs if ms is not None))
+        # the members of existing teams are not read in advance, so all expected members are counted as invites
+        e.add('PUT /teams/:id/memberships/:user', writes=sum(len(ms or ()) for _, ms in team_specs))
+        if any(t in teams for t, _ in team_specs):
+            e.notes.append("all expected members of existing teams are counted as invites, the removals of "
+                           "unexpected members are not counted")
+    if 'delete_teams' in commands:
+        e.add('DELETE /teams/:id', writes=len([t for t, _ in team_specs if t in teams]))
+
+    return e
+
+
+def trello(config, user_repository, commands, card_list=None, changed=None):
+    """
+    Fetches the Trello organization state and estimates the calls of the given commands for all groups or only the
+    given changed groups (see ProvisionController).
+
+    Returns the estimate and the credential pool.
+    """
+    organization = config.get('trello', 'organization')
+
+    client = trelloapi.TrelloClient(credentials.trello_pool(config), config.get('trello', 'max_in_flight'))
+    # the nested read provides the exact lists and members of all existing boards at once
+    reader = trelloapi.BoardReader(client, 'nested')
+
+    try:
+        # fetch the organization state and measure the request latency on the way
+        start = time.time()
+        try:
+            client.organization(organization)
+        except RequestException:
+            raise RuntimeError("Organization '%s' not found" % organization)
+        boards = reader.boards(organization)
+        latency = (time.time() - start) / 2
+    finally:
+        client.close()
+
+    e = trello_calls(config, user_repository, commands, dict((b['name'], b) for b in boards), reader.states(boards),
+                     card_list, changed)
+    e.latency = latency
+    return e, client.credentials
+
+
+def trello_calls(config, user_repository, commands, boards, states, card_list=None, changed=None):
+    """
+    Estimates the Trello calls of the given commands for the given organization boards and their states (for all
+    groups or only the given changed groups).
+    """
+    # schema keys
+    key_trello = config.get('core', 'users_schema_key_trello')
+    # boards setup
+    board_admins_name = config.get('trello', 'board_admins')
+    board_pattern = config.get('trello', 'board_pattern')
+    board_lists = config.get('trello', 'board_lists')
+    admins_group = config.get('trello', 'board_admins_group')
+    read_mode = config.get('trello', 'read_mode')
+
+    # the board admins are members of all boards
+    if changed is not None and '%d' % int(admins_group) in changed:
+        changed = None
+
+    accounts = lambda group: set(a for a in user_repository.accounts(key_trello, group) if a)
+    board_admins = accounts(admins_group)
+    board_specs = [(board_pattern % int(g), board_admins, accounts(g))
+                   for g in user_repository.groups() if changed is None or g in changed]
+    group_boards = [name for name, _, _ in board_specs]
+    if changed is None:
+        board_specs.append((board_admins_name, board_admins, set()))
+
+    e = Estimate('Trello', config.get('trello', 'max_in_flight'), window=10)
+    e.add('GET /organizations/:org', reads=1)
+    e.add('GET /organizations/:org/boards', reads=1)
+
+    def read_states(names):
+        uncovered = [n for n in names if read_mode != 'nested' or n not in boards]
+        if read_mode == 'single':
+            e.add('GET /boards/:id/(lists|members)', reads=3 * len(uncovered))
+        elif uncovered:
+            e.add('GET /batch', reads=(3 * len(uncovered) + trelloapi.TrelloClient.BATCH_SIZE - 1) //
+                  trelloapi.TrelloClient.BATCH_SIZE)
+
+    if 'create_boards' in commands:
+        read_states([name for name, _, _ in board_specs])
+        e.add('POST /boards', writes=len([name for name, _, _ in board_specs if name not in boards]))
+        for name, admins, members in board_specs:
+            if name in boards:
+                state = states[boards[name]['id']]
+                lists = set(l['name'] for l in state.lists)
+                missing_admins, missing_members = admins - state.admins, members - state.members
+            else:
+                lists = set(TRELLO_DEFAULT_LISTS)
+                missing_admins, missing_members = admins, members
+            e.add('POST /lists', writes=len([l for l in board_lists if l not in lists]))
+            e.add('PUT /boards/:id/members/:member', writes=len(missing_admins) + len(missing_members))
+
+    if 'create_card' in commands:
+        read_states([name for name in group_boards if name in boards])
+        e.add('POST /cards', writes=len([name for name in group_boards if name in boards and card_list in set(
+            l['name'] for l in states[boards[name]['id']].lists)]))
+
+    if 'provision_card' in commands:
+        e.add('GET /boards/:id/cards', reads=len(group_boards))
+        e.add('POST /cards', writes=len(group_boards))
+        e.upper_bound = True
+
+    return e
+
+
+def seed(starter, urls, jobs):
+    """
+    Reads the seed branch of the given remote repositories and estimates the git operations of 'github seed-repos'
+    for the given RepoSeed. Repositories that cannot be read are counted as pushes.
+
+    Returns the estimate.
+    """
+    def read(url):
+        try:
+            return starter.state(url)
+        except error.GitError:
+            return False
+
+    jobs = max(1, min(int(jobs), len(urls)))
+    workers = ThreadPool(jobs)
+    try:
+        start = time.time()
+        commits = workers.map_async(read, urls).get(WAIT_TIMEOUT)
+        latency = (time.time() - start) * jobs / max(1, len(urls))
+    finally:
+        workers.close()
+        workers.join()
+
+    e = Estimate('Git', jobs)
+    e.latency = latency
+    e.add('git ls-remote', reads=len(urls))
+    e.add('git push', writes=len([c for c in commits if c is None or c is False]))
+    e.upper_bound = any(c is False for c in commits)
+    return e
@@ -21,10 +21,12 @@ from __future__ import absolute_import
 import os
 import sys
 import socket
+import hashlib
+from contextlib import contextmanager
 
 # noinspection PyPackageRequirements
-from scrumtools import data, error
-from termcolor import cprint, colored
+from scrumtools import data, database, error, output
+from termcolor import colored
 from cement.core import controller
 
 try:
@@ -33,6 +35,113 @@ except NameError:
     prompt = input
 
 
+USERS_COLUMNS = ['username', 'password', 'enabled']
+GROUPS_COLUMNS = ['id', 'group_name', 'course_id']
+GROUP_AUTHORITIES_COLUMNS = ['group_id', 'authority']
+GROUP_MEMBERS_COLUMNS = ['group_id', 'username']
+
+
+class Md5(object):
+    """
+    A value that is stored as the MD5 hex digest of the given text.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def hexdigest(self):
+        return hashlib.md5(self.text.encode('utf-8')).hexdigest()
+
+
+class SqlWriter(object):
+    """
+    Writes table rows as SQL to a stream.
+
+    Supported formats are:
+     * 'insert'   - one INSERT statement per row;
+     * 'multirow' - multi-row INSERT statements with at most batch_size rows each;
+     * 'copy'     - PostgreSQL COPY ... FROM STDIN blocks (MD5 values are computed client-side).
+    """
+
+    FORMATS = ['insert', 'multirow', 'copy']
+
+    def __init__(self, out, fmt='insert', batch_size=1000, color=False):
+        if fmt not in self.FORMATS:
+            raise ValueError("Invalid SQL format '%s' (expected one of %s)" % (fmt, ', '.join(self.FORMATS)))
+
+        self.__out = out
+        self.__format = fmt
+        self.__batch_size = max(1, int(batch_size))
+        self.__color = color
+
+    def comment(self, text):
+        self.__write("-- %s" % text)
+
+    def table(self, table, columns, rows):
+        if self.__format == 'copy':
+            self.__write("COPY %s (%s) FROM STDIN;" % (table, ', '.join(columns)))
+            for row in rows:
+                self.__write('\t'.join(self.__class__.copy_value(v) for v in row))
+            self.__write('\\.')
+            return
+
+        prefix = "INSERT INTO %s(%s) VALUES" % (table, ', '.join(columns))
+        if self.__format == 'insert':
+            for row in rows:
+                self.__write("%s (%s);" % (prefix, ', '.join(self.__class__.sql_value(v) for v in row)))
+            return
+
+        batch = []
+        for row in rows:
+            batch.append("(%s)" % ', '.join(self.__class__.sql_value(v) for v in row))
+            if len(batch) == self.__batch_size:
+                self.__write("%s\n  %s;" % (prefix, ',\n  '.join(batch)))
+                batch = []
+        if batch:
+            self.__write("%s\n  %s;" % (prefix, ',\n  '.join(batch)))
+
+    def update(self, table, columns, keys, rows):
+        """
+        Writes one UPDATE statement per row. Each row holds the column values followed by the key values.
+        """
+        for row in rows:
+            self.__write("UPDATE %s SET %s WHERE %s;" % (table, self.__class__.conditions(columns, row, ', '),
+                                                          self.__class__.conditions(keys, row[len(columns):], ' AND ')))
+
+    def delete(self, table, keys, rows):
+        for row in rows:
+            self.__write("DELETE FROM %s WHERE %s;" % (table, self.__class__.conditions(keys, row, ' AND ')))
+
+    def __write(self, text):
+        if self.__color:
+            text = colored(text, 'green')
+        self.__out.write((text + '\n').encode('utf-8'))
+
+    @staticmethod
+    def sql_value(v):
+        if isinstance(v, Md5):
+            return "md5(%s)" % SqlWriter.sql_value(v.text)
+        if isinstance(v, bool):
+            return 'true' if v else 'false'
+        if isinstance(v, (int, long)):
+            return '%d' % v
+        return "'%s'" % v.replace("'", "''")
+
+    @staticmethod
+    def conditions(columns, values, separator):
+        return separator.join('%s = %s' % (c, SqlWriter.sql_value(v)) for c, v in zip(columns, values))
+
+    @staticmethod
+    def copy_value(v):
+        if isinstance(v, Md5):
+            return v.hexdigest()
+        if isinstance(v, bool):
+            return 't' if v else 'f'
+        if isinstance(v, (int, long)):
+            return '%d' % v
+        return v.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
 class EvalToolController(controller.CementBaseController):
     class Meta:
         label = 'evaltool'
@@ -45,6 +154,9 @@ class EvalToolController(controller.CementBaseController):
         config_defaults = dict(
             course_id='1000',
             group_pattern='example.g%02d',
+            sql_format='insert',
+            batch_size=1000,
+            database_url=None,
         )
 
         arguments = [
@@ -54,6 +166,28 @@ class EvalToolController(controller.CementBaseController):
             (['-O', '--organization'],
              dict(action='store', metavar='NAME', dest='organization',
                   help='the organization managing the GitHub repositories')),
+            (['-F', '--format'],
+             dict(action='store', metavar='FORMAT', dest='sql_format', choices=SqlWriter.FORMATS,
+                  help='the SQL output format (%s)' % ', '.join(SqlWriter.FORMATS))),
+            (['-B', '--batch-size'],
+             dict(action='store', metavar='N', dest='batch_size', type=int,
+                  help='maximum number of rows per multi-row INSERT statement')),
+            (['-o', '--output'],
+             dict(action='store', metavar='FILE', dest='output', default=None,
+                  help='write the SQL code to a file instead of the standard output')),
+            (['-d', '--database-url'],
+             dict(action='store', metavar='URL', dest='database_url',
+                  help='the evaluation tool database (e.g. postgresql://user@host/evaltool or sqlite:///evaltool.db)')),
+            (['--create-tables'],
+             dict(action='store_true', dest='create_tables',
+                  help='create missing evaluation tool tables before loading (e.g. for local stand-ins)')),
+            (['--dump-file'],
+             dict(action='store', metavar='FILE', dest='dump_file', default=None,
+                  help='read the current database contents from a COPY-format dump instead of the database')),
+            (['--apply'],
+             dict(action='store_true', dest='apply',
+                  help='apply the synchronization delta to the database instead of dumping it as SQL code')),
+            output.ARGUMENT,
         ]
 
     @controller.expose(hide=True)
@@ -63,45 +197,295 @@ class EvalToolController(controller.CementBaseController):
     @controller.expose(help="Dump SQL code for groups.")
     def dump_sql_groups(self):
         self.app.log.debug('Dumping SQL code for groups.')
+        self.__separate_output()
+
+        user_repository = data.UserRepository(self.app.config)
+
+        with self.__writer() as writer:
+            writer.comment("Groups")
+            writer.table('GROUPS', GROUPS_COLUMNS, self.__group_rows(user_repository, 'GROUPS'))
+            writer.comment("Group Authorities")
+            writer.table('GROUP_AUTHORITIES', GROUP_AUTHORITIES_COLUMNS,
+                         self.__group_rows(user_repository, 'GROUP_AUTHORITIES'))
+            writer.comment("Group Members")
+            writer.table('GROUP_MEMBERS', GROUP_MEMBERS_COLUMNS, self.__group_rows(user_repository, 'GROUP_MEMBERS'))
+
+    @controller.expose(help="Dump SQL code for users.")
+    def dump_sql_users(self):
+        self.app.log.debug('Dumping SQL code for users.')
+        self.__separate_output()
+
+        user_repository = data.UserRepository(self.app.config)
+
+        with self.__writer() as writer:
+            writer.comment("Users")
+            writer.table('USERS', USERS_COLUMNS, self.__user_rows(user_repository))
+
+    @controller.expose(help="Load groups into the evaluation tool database.")
+    def load_groups(self):
+        self.app.log.debug('Loading groups into the evaluation tool database.')
+        self.__load(data.UserRepository(self.app.config), groups=True)
+
+    @controller.expose(help="Load users into the evaluation tool database.")
+    def load_users(self):
+        self.app.log.debug('Loading users into the evaluation tool database.')
+        self.__load(data.UserRepository(self.app.config), users=True)
+
+    @controller.expose(help="Load users and groups into the evaluation tool database (in one transaction).")
+    def load(self):
+        self.app.log.debug('Loading users and groups into the evaluation tool database.')
+        self.__load(data.UserRepository(self.app.config), groups=True, users=True)
+
+    @controller.expose(help="Synchronize the evaluation tool database with the users file (only the delta).")
+    def sync(self):
+        self.app.log.debug('Synchronizing the evaluation tool database.')
+
+        database_url = self.app.config.get('evaltool', 'database_url')
+
+        # validate required config parameters
+        if (self.app.pargs.apply or not self.app.pargs.dump_file) and not database_url:
+            raise error.ConfigError("Missing config parameter 'evaltool.database_url'! "
+                                    "Please set it or use the '--database-url' option!")
 
+        if not self.app.pargs.apply:
+            self.__separate_output()
+
+        batch_size = self.app.config.get('evaltool', 'batch_size')
+        user_repository = data.UserRepository(self.app.config)
+        expected = self.__expected_state(user_repository)
+
+        if not self.app.pargs.apply:
+            if self.app.pargs.dump_file:
+                actual = self.__dump_state(database.read_dump(self.app.pargs.dump_file), expected['USERS'])
+            else:
+                with database.Database(database_url, batch_size) as db:
+                    actual = self.__database_state(db, expected['USERS'])
+            with self.__writer() as writer:
+                for op, table, columns, keys, rows in self.__delta(expected, actual):
+                    writer.comment("%s %d rows %s %s" % (op.capitalize(), len(rows),
+                                                         'into' if op == 'insert' else 'in', table))
+                    if op == 'insert':
+                        writer.table(table, columns, rows)
+                    elif op == 'update':
+                        writer.update(table, columns, keys, rows)
+                    else:
+                        writer.delete(table, keys, rows)
+            return
+
+        with database.Database(database_url, batch_size) as db:
+            if self.app.pargs.dump_file:
+                actual = self.__dump_state(database.read_dump(self.app.pargs.dump_file), expected['USERS'])
+            else:
+                actual = self.__database_state(db, expected['USERS'])
+
+            count = 0
+            for op, table, columns, keys, rows in self.__delta(expected, actual):
+                operation = output.get().operation(table, '%s_rows' % op, "%s %d rows %s %s" % (
+                    {'insert': 'Inserting', 'update': 'Updating', 'delete': 'Deleting'}[op], len(rows),
+                    'into' if op == 'insert' else 'in', table))
+                try:
+                    if op == 'insert':
+                        db.insert(table, columns, rows)
+                    elif op == 'update':
+                        db.update(table, columns, keys, rows)
+                    else:
+                        db.delete(table, keys, rows)
+                    operation.ok()
+                except db.Error as e:
+                    operation.failed()
+                    raise RuntimeError("Cannot %s rows in %s, rolled back all changes (%s)" % (op, table, e))
+                count += len(rows)
+
+        output.get().info("Committed %d changed rows." % count, 'green', attrs=['bold'])
+
+    def __expected_state(self, user_repository):
+        """
+        Returns the rows of this course in the USERS, GROUPS, GROUP_AUTHORITIES and GROUP_MEMBERS tables as expected
+        from the users file.
+        """
+        return dict(USERS=dict((name, (password.hexdigest(), enabled)) for name, password, enabled in
+                               self.__user_rows(user_repository)),
+                    GROUPS=dict((group_id, (name, course_id)) for group_id, name, course_id in
+                                self.__group_rows(user_repository, 'GROUPS')),
+                    GROUP_AUTHORITIES=set(self.__group_rows(user_repository, 'GROUP_AUTHORITIES')),
+                    GROUP_MEMBERS=set(self.__group_rows(user_repository, 'GROUP_MEMBERS')))
+
+    def __database_state(self, db, usernames):
+        """
+        Returns the rows of this course in the evaluation tool tables in the form of __expected_state(). Only the
+        USERS rows of the given usernames are read (users are never deleted, so other rows do not matter).
+        """
+        course_id = int(self.app.config.get('evaltool', 'course_id'))
+        # group IDs of a course are derived from the course ID
+        group_ids = 'BETWEEN %d AND %d' % (course_id * 1000, course_id * 1000 + 999)
+
+        return dict(USERS=dict((name, (password.lower(), bool(enabled))) for name, password, enabled in
+                               db.select('USERS', USERS_COLUMNS, 'username', usernames)),
+                    GROUPS=dict((int(group_id), (name, int(course))) for group_id, name, course in
+                                db.query("SELECT id, group_name, course_id FROM GROUPS WHERE id %s" % group_ids)),
+                    GROUP_AUTHORITIES=set((int(group_id), authority) for group_id, authority in
+                                          db.query("SELECT group_id, authority FROM GROUP_AUTHORITIES "
+                                                   "WHERE group_id %s" % group_ids)),
+                    GROUP_MEMBERS=set((int(group_id), name) for group_id, name in
+                                      db.query("SELECT group_id, username FROM GROUP_MEMBERS "
+                                               "WHERE group_id %s" % group_ids)))
+
+    def __dump_state(self, tables, usernames):
+        """
+        Returns the rows of this course in the given dump tables in the form of __expected_state(). Only the USERS
+        rows of the given usernames are kept.
+        """
+        course_id = int(self.app.config.get('evaltool', 'course_id'))
+
+        def rows(table, columns):
+            if table not in tables:
+                raise RuntimeError("Missing table %s in dump file '%s'" % (table, self.app.pargs.dump_file))
+            table_columns, table_rows = tables[table]
+            missing = [c for c in columns if c not in table_columns]
+            if missing:
+                raise RuntimeError("Missing column(s) %s of table %s in dump file '%s'" % (
+                    ', '.join(missing), table, self.app.pargs.dump_file))
+            indexes = [table_columns.index(c) for c in columns]
+            for i, row in enumerate(table_rows):
+                if len(row) != len(table_columns):
+                    raise RuntimeError("Expected %d values in row %d of table %s in dump file '%s', got %d" % (
+                        len(table_columns), i + 1, table, self.app.pargs.dump_file, len(row)))
+                yield [row[j] for j in indexes]
+
+        def users():
+            for name, password, enabled in rows('USERS', USERS_COLUMNS):
+                if name not in usernames:
+                    continue
+                if password is None:
+                    raise RuntimeError("Missing password of user '%s' in table USERS in dump file '%s'" % (
+                        name, self.app.pargs.dump_file))
+                yield name, (password.lower(), enabled in ('t', 'true', '1'))
+
+        in_course = lambda group_id: course_id * 1000 <= int(group_id) <= course_id * 1000 + 999
+        return dict(USERS=dict(users()),
+                    GROUPS=dict((int(group_id), (name, int(course))) for group_id, name, course in
+                                rows('GROUPS', GROUPS_COLUMNS) if in_course(group_id)),
+                    GROUP_AUTHORITIES=set((int(group_id), authority) for group_id, authority in
+                                          rows('GROUP_AUTHORITIES', GROUP_AUTHORITIES_COLUMNS) if in_course(group_id)),
+                    GROUP_MEMBERS=set((int(group_id), name) for group_id, name in
+                                      rows('GROUP_MEMBERS', GROUP_MEMBERS_COLUMNS) if in_course(group_id)))
+
+    @staticmethod
+    def __delta(expected, actual):
+        """
+        Returns the (operation, table, columns, keys, rows) changes that turn the actual into the expected state.
+
+        Users are only inserted and updated, as they can be members of groups of other courses.
+        """
+        users_exp, users_act = expected['USERS'], actual['USERS']
+        groups_exp, groups_act = expected['GROUPS'], actual['GROUPS']
+        authorities_exp, authorities_act = expected['GROUP_AUTHORITIES'], actual['GROUP_AUTHORITIES']
+        members_exp, members_act = expected['GROUP_MEMBERS'], actual['GROUP_MEMBERS']
+
+        delta = [
+            ('insert', 'USERS', USERS_COLUMNS, None,
+             sorted((k,) + v for k, v in users_exp.items() if k not in users_act)),
+            ('update', 'USERS', ['password', 'enabled'], ['username'],
+             sorted(v + (k,) for k, v in users_exp.items() if k in users_act and users_act[k] != v)),
+            ('insert', 'GROUPS', GROUPS_COLUMNS, None,
+             sorted((k,) + v for k, v in groups_exp.items() if k not in groups_act)),
+            ('update', 'GROUPS', ['group_name', 'course_id'], ['id'],
+             sorted(v + (k,) for k, v in groups_exp.items() if k in groups_act and groups_act[k] != v)),
+            ('insert', 'GROUP_AUTHORITIES', GROUP_AUTHORITIES_COLUMNS, None, sorted(authorities_exp - authorities_act)),
+            ('delete', 'GROUP_MEMBERS', None, GROUP_MEMBERS_COLUMNS, sorted(members_act - members_exp)),
+            ('insert', 'GROUP_MEMBERS', GROUP_MEMBERS_COLUMNS, None, sorted(members_exp - members_act)),
+            ('delete', 'GROUP_AUTHORITIES', None, GROUP_AUTHORITIES_COLUMNS, sorted(authorities_act - authorities_exp)),
+            ('delete', 'GROUPS', None, ['id'], sorted((k,) for k in groups_act if k not in groups_exp)),
+        ]
+        return [change for change in delta if change[4]]
+
+    def __load(self, user_repository, groups=False, users=False):
+        # validate required config parameters
+        if not self.app.config.get('evaltool', 'database_url'):
+            raise error.ConfigError("Missing config parameter 'evaltool.database_url'! "
+                                    "Please set it or use the '--database-url' option!")
+
+        tables = []
+        if users:
+            # compute the password hashes client-side
+            tables.append(('USERS', USERS_COLUMNS,
+                           [(name, password.hexdigest(), enabled) for name, password, enabled in
+                            self.__user_rows(user_repository)]))
+        if groups:
+            for table, columns in [('GROUPS', GROUPS_COLUMNS), ('GROUP_AUTHORITIES', GROUP_AUTHORITIES_COLUMNS),
+                                   ('GROUP_MEMBERS', GROUP_MEMBERS_COLUMNS)]:
+                tables.append((table, columns, list(self.__group_rows(user_repository, table))))
+
+        with database.Database(self.app.config.get('evaltool', 'database_url'),
+                               self.app.config.get('evaltool', 'batch_size')) as db:
+            if self.app.pargs.create_tables:
+                db.create_tables()
+            for table, columns, rows in tables:
+                operation = output.get().operation(table, 'load_rows', "Loading %d rows into %s" % (len(rows), table))
+                try:
+                    db.insert(table, columns, rows)
+                    operation.ok()
+                except db.Error as e:
+                    operation.failed()
+                    raise RuntimeError("Cannot load %s, rolled back all changes (%s)" % (table, e))
+
+        output.get().info("Committed %d rows." % sum(len(rows) for _, _, rows in tables), 'green', attrs=['bold'])
+
+    def __group_rows(self, user_repository, table):
+        """
+        Yields the rows of the given table (GROUPS, GROUP_AUTHORITIES or GROUP_MEMBERS) from the indexed roster.
+        """
         # schema keys
-        key_group = self.app.config.get('core', 'users_schema_key_group')
         key_github = self.app.config.get('core', 'users_schema_key_github')
         # groups setup
         course_id = int(self.app.config.get('evaltool', 'course_id'))
         group_pattern = self.app.config.get('evaltool', 'group_pattern')
 
-        user_repository = data.UserRepository(self.app.config)
-
-        print colored("-- Groups", 'green')
         for group in user_repository.groups():
-            group_name = group_pattern % int(group)
-            print colored("INSERT INTO GROUPS(id, group_name, course_id) VALUES (%d, '%s', %d);" % (course_id * 1000 + int(group), group_name, course_id), 'green')
-
-        print colored("-- Group Authorities", 'green')
-        for group in user_repository.groups():
-            print colored("INSERT INTO GROUP_AUTHORITIES(group_id, authority) values (%d, 'ROLE_USER');" % (course_id * 1000 + int(group)), 'green')
-
-        print colored("-- Group Members", 'green')
-        for group in user_repository.groups():
-            print colored("-- Group %02d" % int(group), 'green')
-            for u in user_repository.users(lambda x: x[key_group] == group):
-                print colored("INSERT INTO GROUP_MEMBERS(group_id, username) values (%d, '%s');" % (course_id * 1000 + int(group), u[key_github]), 'green')
-
-    @controller.expose(help="Dump SQL code for users.")
-    def dump_sql_users(self):
-        self.app.log.debug('Dumping SQL code for users.')
+            group_id = course_id * 1000 + int(group)
+            if table == 'GROUPS':
+                yield group_id, group_pattern % int(group), course_id
+            elif table == 'GROUP_AUTHORITIES':
+                yield group_id, 'ROLE_USER'
+            else:
+                # users with an empty GitHub account have no USERS row (see __user_rows)
+                for u in user_repository.members(group):
+                    if u[key_github]:
+                        yield group_id, u[key_github]
 
+    def __user_rows(self, user_repository):
+        """
+        Yields the rows of the USERS table.
+        """
         # schema keys
         key_id = self.app.config.get('core', 'users_schema_key_id')
         key_github = self.app.config.get('core', 'users_schema_key_github')
 
-        user_repository = data.UserRepository(self.app.config)
-
-        print colored("-- Users", 'green')
+        out = output.get()
         for u in user_repository.users():
             if not u[key_github]:
-                cprint("Skipping empty GitHub account for user '%s'." % u[key_id], 'yellow', file=sys.stdout)
+                out.skip(u[key_id], 'read_user', "Skipping empty GitHub account for user '%s'." % u[key_id])
                 continue
+            yield u[key_github], Md5('%s{%s}' % (u[key_id], u[key_github])), True
+
+    def __separate_output(self):
+        """
+        Moves the progress output to the standard error if the SQL code is written to the standard output.
+        """
+        if not self.app.pargs.output:
+            output.configure(output.get().format, sys.stderr)
+
+    @contextmanager
+    def __writer(self):
+        """
+        Yields a SqlWriter on the '--output' file (buffered) or on the standard output (colored on a terminal).
+        """
+        fmt = self.app.config.get('evaltool', 'sql_format')
+        batch_size = self.app.config.get('evaltool', 'batch_size')
 
-            print colored("INSERT INTO USERS(username, password, enabled) VALUES ('%s', md5('%s{%s}'), true);" % (u[key_github], u[key_id], u[key_github]), 'green')
\ No newline at end of file
+        if self.app.pargs.output:
+            with open(self.app.pargs.output, 'wb', 1 << 16) as f:
+                yield SqlWriter(f, fmt, batch_size)
+        else:
+            yield SqlWriter(sys.stdout, fmt, batch_size, color=sys.stdout.isatty())
+            sys.stdout.flush()
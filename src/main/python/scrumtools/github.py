@@ -19,12 +19,12 @@ Created on Apr 13, 2014
 from __future__ import absolute_import
 
 import os
-import sys
 import socket
+from multiprocessing.pool import ThreadPool
 
 # noinspection PyPackageRequirements
 from github3 import login, models
-from scrumtools import data, error
+from scrumtools import credentials, data, error, estimate, githubapi, output, seed, state, transport
 from termcolor import cprint, colored
 from cement.core import controller
 from requests.exceptions import ConnectionError
@@ -47,6 +47,7 @@ class GitHubController(controller.CementBaseController):
         config_defaults = dict(
             auth_id=None,
             auth_token=None,
+            auth_token_pool=None,
             organization='example.org',
             team_admins='example.admins',
             team_admins_group=-1,
@@ -55,6 +56,14 @@ class GitHubController(controller.CementBaseController):
             repo_admins='example',
             repo_users='example',
             repo_pattern='example.g%02d',
+            max_in_flight=4,
+            # starter code pushed to the group repositories by 'seed-repos'
+            seed_template=None,
+            seed_branch='master',
+            seed_message='Initial commit',
+            seed_author='scrum-tools <scrum-tools@localhost>',
+            seed_url='git@github.com:%(organization)s/%(repo)s.git',
+            seed_jobs=4,
         )
 
         arguments = [
@@ -64,7 +73,19 @@ class GitHubController(controller.CementBaseController):
             (['-O', '--organization'],
              dict(action='store', metavar='NAME', dest='organization',
                   help='the organization managing the GitHub repositories')),
-        ]
+            (['-E', '--estimate'],
+             dict(action='store_true', dest='estimate',
+                  help='only estimate the API calls of the command and check them against the remaining quota')),
+            (['-N', '--changed-only'],
+             dict(action='store_true', dest='changed_only',
+                  help='only update the teams of groups that changed since the last successful run')),
+            (['-T', '--template'],
+             dict(action='store', metavar='PATH', dest='seed_template',
+                  help='a directory or git repository with the starter code of the group repositories')),
+            output.ARGUMENT,
+        ] + transport.ARGUMENTS
+
+    WAIT_TIMEOUT = 24 * 3600  # waiting with a timeout keeps the main thread responsive to signals
 
     @controller.expose(hide=True)
     def default(self):
@@ -102,21 +123,27 @@ class GitHubController(controller.CementBaseController):
 
         user_repository = data.UserRepository(self.app.config)
 
-        gh = login(token=self.app.config.get('github', 'auth_token'))
+        pool = credentials.github_pool(self.app.config)
+        gh = githubapi.login(pool)
 
+        out = output.get()
         for u in user_repository.users():
             if not u[key_github]:
-                cprint("Skipping empty GitHub account for user '%s'." % u[key_username], 'yellow', file=sys.stdout)
+                out.skip(u[key_username], 'validate_user',
+                         "Skipping empty GitHub account for user '%s'." % u[key_username])
                 continue
 
-            print colored("Validating GitHub account '%s' for user '%s'..." % (u[key_github], u[key_username]), 'green'),
+            op = out.operation(u[key_github], 'validate_user',
+                               "Validating GitHub account '%s' for user '%s'" % (u[key_github], u[key_username]))
             try:
                 if gh.user(u[key_github]):
-                    print colored('OK', 'green', attrs=['bold'])
+                    op.ok()
                 else:
                     raise RuntimeError("Github user '%s' not found" % u[key_github])
-            except RuntimeError:
-                print colored('Not OK', 'red', attrs=['bold'])
+            except RuntimeError as e:
+                op.failed(e)
+
+        self.__report_quota(pool)
 
     @controller.expose(help="Creates GitHub repositories.")
     def create_repos(self):
@@ -140,8 +167,13 @@ class GitHubController(controller.CementBaseController):
 
         # get the users
         user_repository = data.UserRepository(self.app.config)
+
+        if self.app.pargs.estimate:
+            return self.__estimate(['create_repos'], user_repository)
+
         # create github session
-        gh = login(token=self.app.config.get('github', 'auth_token'))
+        pool = credentials.github_pool(self.app.config)
+        gh = githubapi.login(pool)
 
         # get the organization
         org = gh.organization(organization)
@@ -167,12 +199,76 @@ class GitHubController(controller.CementBaseController):
         repo_teams = [v for (k, v) in teams.iteritems() if k in [team_admins, team_users]]
         self.__class__.__create_repo(org, repo_users, repo_teams, repos)
 
+        self.__report_quota(pool)
+
+    @controller.expose(help="Pushes starter code to the empty GitHub group repositories.")
+    def seed_repos(self):
+        self.app.log.debug('Seeding GitHub repositories.')
+
+        # validate required config parameters
+        if not self.app.config.get('github', 'seed_template'):
+            raise error.ConfigError("Missing config parameter 'github.seed_template'! "
+                                    "Please set a '--template' option value!")
+
+        # organization
+        organization = self.app.config.get('github', 'organization')
+        # repos setup
+        repo_pattern = self.app.config.get('github', 'repo_pattern')
+        url_pattern = self.app.config.get('github', 'seed_url')
+
+        user_repository = data.UserRepository(self.app.config)
+        repos = [repo_pattern % int(group) for group in user_repository.groups()]
+        jobs = self.app.config.get('github', 'seed_jobs')
+
+        # build the starter commit once
+        starter = seed.RepoSeed(self.app.config.get('github', 'seed_template'),
+                                self.app.config.get('github', 'seed_branch'),
+                                self.app.config.get('github', 'seed_message'),
+                                self.app.config.get('github', 'seed_author'))
+        out = output.get()
+
+        if self.app.pargs.estimate:
+            try:
+                urls = [url_pattern % dict(organization=organization, repo=repo) for repo in repos]
+                for line, color in estimate.seed(starter, urls, jobs).report(None):
+                    out.info(line, color)
+            finally:
+                starter.close()
+            return
+
+        def push(repo):
+            url = url_pattern % dict(organization=organization, repo=repo)
+            operation = out.operation(repo, 'seed_repo', "Seeding repository '%s'" % repo)
+            try:
+                commit = starter.state(url)
+                if commit == starter.commit:
+                    return operation.ok('already seeded')
+                if commit is not None:
+                    out.skip(repo, 'seed_repo', "Skipping repository '%s' (branch '%s' exists)." % (
+                        repo, starter.branch))
+                    return True
+                starter.push(url)
+                return operation.ok()
+            except error.GitError as e:
+                return operation.failed(e)
+
+        workers = ThreadPool(max(1, min(int(jobs), len(repos))))
+        try:
+            results = [workers.apply_async(push, (repo,)) for repo in repos]
+            for result in results:
+                result.get(self.WAIT_TIMEOUT)
+        finally:
+            workers.close()
+            workers.join()
+            starter.close()
+
     @controller.expose(help="Deletes GitHub repositories.")
     def delete_repos(self):
         self.app.log.debug('Deleting GitHub repositories.')
 
-        if not self.__class__.prompt_confirm(colored('This cannot be undone! Proceed? (yes/no): ', 'red')):
-            cprint("Aborting delete command.", 'yellow', file=sys.stdout)
+        if not self.app.pargs.estimate and \
+                not self.__class__.prompt_confirm(colored('This cannot be undone! Proceed? (yes/no): ', 'red')):
+            output.get().info("Aborting delete command.", 'yellow')
             return
 
         # validate required config parameters
@@ -189,7 +285,11 @@ class GitHubController(controller.CementBaseController):
 
         user_repository = data.UserRepository(self.app.config)
 
-        gh = login(token=self.app.config.get('github', 'auth_token'))
+        if self.app.pargs.estimate:
+            return self.__estimate(['delete_repos'], user_repository)
+
+        pool = credentials.github_pool(self.app.config)
+        gh = githubapi.login(pool)
 
         # get the organization
         org = gh.organization(organization)
@@ -210,6 +310,8 @@ class GitHubController(controller.CementBaseController):
         # delete users repo
         self.__class__.__delete_repo(repo_users, repos)
 
+        self.__report_quota(pool)
+
     @controller.expose(help="Creates GitHub teams.")
     def create_teams(self):
         self.app.log.debug('Creating GitHub teams.')
@@ -220,7 +322,6 @@ class GitHubController(controller.CementBaseController):
                                     "Please run 'scrum-tools github authorize' first! ")
 
         # schema keys
-        key_group = self.app.config.get('core', 'users_schema_key_group')
         key_github = self.app.config.get('core', 'users_schema_key_github')
         # organization
         organization = self.app.config.get('github', 'organization')
@@ -236,8 +337,27 @@ class GitHubController(controller.CementBaseController):
 
         # get the users
         user_repository = data.UserRepository(self.app.config)
+
+        if self.app.pargs.estimate:
+            return self.__estimate(['create_teams'], user_repository)
+
+        # restrict the run to the groups changed since the last successful run
+        roster_state = state.RosterState(self.app.config.get('core', 'state_file'))
+        settings = [organization, team_admins, team_admins_group, team_users, team_pattern,
+                    repo_admins, repo_users, repo_pattern]
+        fingerprints = user_repository.fingerprints()
+        changed = roster_state.changed(state.scope(self.app.config, 'github.create_teams'), settings, fingerprints)
+        groups = list(user_repository.groups())
+        if self.app.pargs.changed_only:
+            if not changed:
+                output.get().info("Skipping all teams (roster unchanged since the last successful run).", 'yellow')
+                return
+            groups = [group for group in groups if group in changed]
+            output.get().info("Updating teams for %d changed group(s): %s." % (len(groups), ', '.join(groups)), 'cyan')
+
         # create github session
-        gh = login(token=self.app.config.get('github', 'auth_token'))
+        pool = credentials.github_pool(self.app.config)
+        gh = githubapi.login(pool)
 
         # get the organization
         org = gh.organization(organization)
@@ -246,46 +366,58 @@ class GitHubController(controller.CementBaseController):
 
         # get all organization teams
         teams = dict((t.name, t) for t in org.iter_teams())
+        ok = True
+
+        # users without a GitHub account are not invited
+        accounts = lambda group: set(a for a in user_repository.accounts(key_github, group) if a)
 
         # create group teams
-        for group in user_repository.groups():
+        for group in groups:
             team_name = team_pattern % int(group)
             repo_names = ['%s/%s' % (organization, repo_pattern % int(group))]
-            self.__class__.__create_team(org, team_name, repo_names, 'push', teams)
+            ok &= self.__class__.__create_team(org, team_name, repo_names, 'push', teams)
 
         # update group teams members
-        for group in user_repository.groups():
+        for group in groups:
             team = teams[team_pattern % int(group)]
             members_act = set(m.login for m in team.iter_members())
-            members_exp = set(u[key_github] for u in user_repository.users(lambda x: x[key_group] == group))
-            self.__class__.__update_team_members(team, members_act, members_exp)
+            members_exp = accounts(group)
+            ok &= self.__class__.__update_team_members(team, members_act, members_exp)
 
         # create admins team
         repo_names = ['%s/%s' % (organization, repo_admins)] + \
                      ['%s/%s' % (organization, repo_users)] + \
                      ['%s/%s' % (organization, repo_pattern % int(group)) for group in user_repository.groups()]
-        self.__class__.__create_team(org, team_admins, repo_names, 'admin', teams)
+        ok &= self.__class__.__create_team(org, team_admins, repo_names, 'admin', teams)
 
         # update admins team members
-        team = teams[team_admins]
-        members_act = set(m.login for m in team.iter_members())
-        members_exp = set(u[key_github] for u in user_repository.users(lambda x: x[key_group] == team_admins_group))
-        self.__class__.__update_team_members(team, members_act, members_exp)
+        if not self.app.pargs.changed_only or '%d' % int(team_admins_group) in changed:
+            team = teams[team_admins]
+            members_act = set(m.login for m in team.iter_members())
+            members_exp = accounts(team_admins_group)
+            ok &= self.__class__.__update_team_members(team, members_act, members_exp)
 
         # create users team
         repo_names = ['%s/%s' % (organization, repo_users)]
-        self.__class__.__create_team(org, team_users, repo_names, 'pull', teams)
+        ok &= self.__class__.__create_team(org, team_users, repo_names, 'pull', teams)
 
         # update users team members
         team = teams[team_users]
         members_act = set(m.login for m in team.iter_members())
-        members_exp = set(u[key_github] for u in user_repository.users())
-        self.__class__.__update_team_members(team, members_act, members_exp)
+        members_exp = accounts(None)
+        ok &= self.__class__.__update_team_members(team, members_act, members_exp)
+
+        # record the roster only if all changes were applied
+        if ok:
+            roster_state.save(state.scope(self.app.config, 'github.create_teams'), settings, fingerprints)
+
+        self.__report_quota(pool)
 
     @controller.expose(help="Deletes GitHub teams.")
     def delete_teams(self):
-        if not self.__class__.prompt_confirm(colored('This cannot be undone! Proceed? (yes/no): ', 'red')):
-            cprint("Aborting delete command.", 'yellow', file=sys.stdout)
+        if not self.app.pargs.estimate and \
+                not self.__class__.prompt_confirm(colored('This cannot be undone! Proceed? (yes/no): ', 'red')):
+            output.get().info("Aborting delete command.", 'yellow')
             return
 
         self.app.log.debug('Deleting GitHub teams.')
@@ -304,7 +436,11 @@ class GitHubController(controller.CementBaseController):
 
         user_repository = data.UserRepository(self.app.config)
 
-        gh = login(token=self.app.config.get('github', 'auth_token'))
+        if self.app.pargs.estimate:
+            return self.__estimate(['delete_teams'], user_repository)
+
+        pool = credentials.github_pool(self.app.config)
+        gh = githubapi.login(pool)
 
         # get the organization
         org = gh.organization(organization)
@@ -325,82 +461,95 @@ class GitHubController(controller.CementBaseController):
         # delete users team
         self.__class__.__delete_team(team_users, teams)
 
+        self.__report_quota(pool)
+
+    def __estimate(self, commands, user_repository):
+        est, pool = estimate.github(self.app.config, user_repository, commands)
+        for line, color in est.report(pool):
+            output.get().info(line, color)
+
+    def __report_quota(self, pool):
+        for line in pool.report():
+            if len(pool) > 1:
+                output.get().info(line, 'cyan')
+            else:
+                self.app.log.debug(line)
+
     @staticmethod
     def __create_repo(org, repo_name, teams, repos):
+        out = output.get()
         if not repo_name in repos:
-            print colored("Creating repository '%s'..." % repo_name, 'green'),
+            op = out.operation(repo_name, 'create_repo', "Creating repository '%s'" % repo_name)
             repo = org.create_repo(name=repo_name, private=True, has_wiki=False)
             if repo:
                 repos[repo_name] = repo
-                print colored('OK', 'green', attrs=['bold'])
-            else:
-                print colored('Not OK', 'red', attrs=['bold'])
+            op.result(repo)
         else:
-            print colored("Skipping repository '%s' (already exists)." % repo_name, 'yellow')
+            out.skip(repo_name, 'create_repo', "Skipping repository '%s' (already exists)." % repo_name)
 
         for team in teams:
-            print colored("Adding repo '%s/%s' to team '%s'..." % (org.login, repo_name, team.name), 'green'),
-            if team.add_repo('%s/%s' % (org.login, repo_name)):
-                print colored('OK', 'green', attrs=['bold'])
-            else:
-                print colored('Not OK', 'red', attrs=['bold'])
+            full_name = '%s/%s' % (org.login, repo_name)
+            op = out.operation('%s:%s' % (team.name, full_name), 'link_repo',
+                               "Adding repo '%s' to team '%s'" % (full_name, team.name))
+            op.result(team.add_repo(full_name))
 
     @staticmethod
     def __delete_repo(repo_name, repos):
+        out = output.get()
         if repo_name in repos:
-            print colored("Deleting repository '%s'..." % repo_name, 'green'),
+            op = out.operation(repo_name, 'delete_repo', "Deleting repository '%s'" % repo_name)
             if repos[repo_name].delete():
                 del repos[repo_name]
-                print colored('OK', 'green', attrs=['bold'])
+                op.ok()
             else:
-                print colored('Not OK', 'red', attrs=['bold'])
+                op.failed()
         else:
-            print colored("Skipping repository '%s' (does not exist)." % repo_name, 'yellow')
+            out.skip(repo_name, 'delete_repo', "Skipping repository '%s' (does not exist)." % repo_name)
 
     @staticmethod
     def __create_team(org, team_name, repo_names, premission, teams):
+        out = output.get()
         if not team_name in teams:
-            print colored("Creating team '%s'..." % team_name, 'green'),
+            op = out.operation(team_name, 'create_team', "Creating team '%s'" % team_name)
             team = org.create_team(name=team_name, repo_names=repo_names, permission=premission)
             if team:
                 teams[team_name] = team
-                print colored('OK', 'green', attrs=['bold'])
-            else:
-                print colored('Not OK', 'red', attrs=['bold'])
+            return op.result(team)
         else:
-            print colored("Skipping team '%s' (already exists)." % team_name, 'yellow')
+            out.skip(team_name, 'create_team', "Skipping team '%s' (already exists)." % team_name)
+        return True
 
     @staticmethod
     def __delete_team(team_name, teams):
+        out = output.get()
         if team_name in teams:
-            print colored("Deleting team '%s'..." % team_name, 'green'),
+            op = out.operation(team_name, 'delete_team', "Deleting team '%s'" % team_name)
             if teams[team_name].delete():
                 del teams[team_name]
-                print colored('OK', 'green', attrs=['bold'])
+                op.ok()
             else:
-                print colored('Not OK', 'red', attrs=['bold'])
+                op.failed()
         else:
-            print colored("Skipping team '%s' (does not exist)." % team_name, 'yellow')
+            out.skip(team_name, 'delete_team', "Skipping team '%s' (does not exist)." % team_name)
 
     @staticmethod
     def __update_team_members(team, members_act, members_exp):
-        print colored("Updating team members for team '%s'." % team.name, 'green')
+        out = output.get()
+        out.info("Updating team members for team '%s'." % team.name)
+        ok = True
 
         # add missing team members
         for u in members_exp - members_act:
-            print colored("Adding '%s' to team '%s'..." % (u, team.name), 'green'),
-            if team.invite(u):
-                print colored('OK', 'green', attrs=['bold'])
-            else:
-                print colored('Not OK', 'red', attrs=['bold'])
+            op = out.operation('%s:%s' % (team.name, u), 'invite', "Adding '%s' to team '%s'" % (u, team.name))
+            ok &= op.result(team.invite(u))
 
         # remove unexpected team members
         for u in members_act - members_exp:
-            print colored("Removing '%s' from team '%s'..." % (u, team.name), 'green'),
-            if team.remove_member(u):
-                print colored('OK', 'green', attrs=['bold'])
-            else:
-                print colored('Not OK', 'red', attrs=['bold'])
+            op = out.operation('%s:%s' % (team.name, u), 'remove_member',
+                               "Removing '%s' from team '%s'" % (u, team.name))
+            ok &= op.result(team.remove_member(u))
+
+        return ok
 
     @staticmethod
     def prompt_login():
@@ -0,0 +1,95 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+import requests
+# noinspection PyPackageRequirements
+from github3 import GitHub
+# noinspection PyPackageRequirements
+from github3.session import GitHubSession
+
+from scrumtools import cache, transport
+
+
+RATE_LIMIT_URL = 'https://api.github.com/rate_limit'
+
+
+class PooledGitHubSession(GitHubSession):
+    """
+    A github3 session that authenticates every request with a token acquired from a CredentialPool.
+
+    GET requests are served from the run-scoped request cache (see cache.RequestCache), writes invalidate it. If
+    max_in_flight is given, at most that many requests are sent concurrently through the session (from any thread).
+    """
+
+    def __init__(self, credentials, max_in_flight=None):
+        super(PooledGitHubSession, self).__init__()
+        self.credentials = credentials
+        self.__in_flight = threading.BoundedSemaphore(int(max_in_flight)) if max_in_flight else None
+        transport.mount(self)
+
+    def request(self, method, url, **kwargs):
+        headers = kwargs.get('headers') or {}
+        # conditional requests are not cached, as their (empty) 304 responses depend on the caller's ETag
+        if method.upper() == 'GET' and not kwargs.get('stream') and 'If-None-Match' not in headers:
+            accept = headers.get('Accept', self.headers.get('Accept'))
+            return cache.get().get(url, kwargs.get('params'), lambda: self.__request(method, url, **kwargs), accept)
+        try:
+            return self.__request(method, url, **kwargs)
+        finally:
+            if method.upper() not in ['GET', 'HEAD']:
+                cache.get().invalidate(url, method, kwargs.get('params'))
+
+    def __request(self, method, url, **kwargs):
+        if self.__in_flight is None:
+            return self.__send(method, url, **kwargs)
+        with self.__in_flight:
+            return self.__send(method, url, **kwargs)
+
+    def __send(self, method, url, **kwargs):
+        credential = self.credentials.acquire()
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers['Authorization'] = 'token %s' % credential.token
+        response = super(PooledGitHubSession, self).request(method, url, headers=headers, **kwargs)
+        self.credentials.update(credential, response.headers)
+        return response
+
+
+def login(credentials, max_in_flight=None):
+    """
+    Returns a GitHub instance whose requests (including those of all objects obtained from it) are spread across the
+    given credentials, with at most max_in_flight concurrent requests (if given).
+    """
+    gh = GitHub()
+    # github3 objects share the session of the instance they were obtained from
+    gh._session = PooledGitHubSession(credentials, max_in_flight)
+    return gh
+
+
+def rate_limit(credentials):
+    """
+    Updates the quota of all credentials in the given pool (requests for the rate limit status are not counted).
+    """
+    session = transport.mount(requests.Session())
+    for credential in credentials:
+        resp = session.get(RATE_LIMIT_URL, headers={'Authorization': 'token %s' % credential.token})
+        resp.raise_for_status()
+        credentials.update(credential, resp.headers)
@@ -0,0 +1,223 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import sys
+import json
+import time
+import threading
+
+from termcolor import colored
+
+from scrumtools import error
+
+
+FORMATS = ['text', 'json', 'quiet']
+
+# the argument selecting the output format (shared by all controllers; overrides 'core.report_format')
+ARGUMENT = (['--report'],
+            dict(action='store', metavar='FORMAT', dest='report_format', choices=FORMATS,
+                 help='progress output format (%s)' % ', '.join(FORMATS)))
+
+
+class Reporter(object):
+    """
+    Reports the outcome of API and database operations.
+
+    Supported formats are:
+     * 'text'  - one colored line per operation (e.g. "Creating team 'x'... OK");
+     * 'json'  - one JSON record per operation (resource, action, status, latency, message and error), followed by a
+                 summary record;
+     * 'quiet' - only an aggregated summary of all operations at the end.
+
+    Each record is written at once under a lock, so operations can be reported from concurrent threads. The output is
+    buffered and flushed every BUFFER_SIZE bytes, on flush() and on close() (and after each line for text output to a
+    terminal).
+    """
+
+    OK = 'ok'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, fmt='text', stream=None):
+        if fmt not in FORMATS:
+            raise error.ConfigError("Invalid output format '%s' (expected one of %s)" % (fmt, ', '.join(FORMATS)))
+
+        self.__format = fmt
+        self.__stream = stream if stream is not None else sys.stdout
+        self.__line_buffered = fmt == 'text' and hasattr(self.__stream, 'isatty') and self.__stream.isatty()
+        self.__lock = threading.RLock()
+        self.__buffer = []
+        self.__buffer_size = 0
+        self.__start = time.time()
+        self.__stats = dict()  # (action, status) -> [count, total latency]
+
+    @property
+    def format(self):
+        return self.__format
+
+    def operation(self, resource, action, message):
+        """
+        Starts timing an operation, which is reported once ok() or failed() is called on the returned object.
+        """
+        return Operation(self, resource, action, message)
+
+    def done(self, resource, action, message, status, latency=None, error=None, detail=None):
+        with self.__lock:
+            stats = self.__stats.setdefault((action, status), [0, 0.0])
+            stats[0] += 1
+            stats[1] += latency or 0.0
+
+            if self.__format == 'text':
+                if status == self.OK and detail:
+                    line = colored("%s..." % message, 'green') + ' ' + colored('OK (%s)' % detail, 'yellow',
+                                                                               attrs=['bold'])
+                elif status == self.OK:
+                    line = colored("%s..." % message, 'green') + ' ' + colored('OK', 'green', attrs=['bold'])
+                elif status == self.FAILED:
+                    line = colored("%s..." % message, 'green') + ' ' + colored('Not OK', 'red', attrs=['bold'])
+                    if error:
+                        line += ' ' + colored("(%s)" % error, 'red')
+                else:
+                    line = colored(message, 'yellow')
+                self.__write(line)
+            elif self.__format == 'json':
+                record = dict(type='operation', resource=resource, action=action, status=status, message=message)
+                if latency is not None:
+                    record['latency'] = round(latency, 3)
+                if error:
+                    record['error'] = '%s' % error
+                if detail:
+                    record['detail'] = detail
+                self.__write(json.dumps(record, sort_keys=True))
+
+    def skip(self, resource, action, message):
+        self.done(resource, action, message, self.SKIPPED)
+
+    def info(self, message, color='green', attrs=None):
+        """
+        Reports a message that does not belong to an operation (omitted in quiet mode).
+        """
+        with self.__lock:
+            if self.__format == 'text':
+                self.__write(colored(message, color, attrs=attrs))
+            elif self.__format == 'json':
+                self.__write(json.dumps(dict(type='info', message=message), sort_keys=True))
+
+    def flush(self):
+        with self.__lock:
+            if self.__buffer:
+                self.__stream.write(''.join(self.__buffer))
+                self.__buffer = []
+                self.__buffer_size = 0
+            self.__stream.flush()
+
+    def close(self):
+        """
+        Writes the summary (in json and quiet mode) and flushes the output.
+        """
+        with self.__lock:
+            elapsed = time.time() - self.__start
+            if self.__format == 'json':
+                actions = dict()
+                for (action, status), (count, latency) in self.__stats.items():
+                    actions.setdefault(action, dict())[status] = count
+                self.__write(json.dumps(dict(type='summary', actions=actions, elapsed=round(elapsed, 3)),
+                                        sort_keys=True))
+            elif self.__format == 'quiet' and self.__stats:
+                for action in sorted(set(a for a, _ in self.__stats)):
+                    counts = [self.__stats.get((action, s), [0, 0.0]) for s in [self.OK, self.FAILED, self.SKIPPED]]
+                    executed = counts[0][0] + counts[1][0]
+                    latency = (counts[0][1] + counts[1][1]) / executed if executed else 0.0
+                    self.__write("%-20s %6d OK %6d not OK %6d skipped (%.3fs avg)" % (
+                        action, counts[0][0], counts[1][0], counts[2][0], latency))
+                total = sum(count for count, _ in self.__stats.values())
+                failed = sum(count for (_, s), (count, _) in self.__stats.items() if s == self.FAILED)
+                self.__write(colored("%d operation(s) in %.1fs, %d not OK." % (total, elapsed, failed),
+                                     'green' if not failed else 'red', attrs=['bold']))
+            self.__stats = dict()
+            self.flush()
+
+    def __write(self, line):
+        if isinstance(line, unicode):
+            line = line.encode('utf-8')
+        self.__buffer.append(line + '\n')
+        self.__buffer_size += len(line) + 1
+        if self.__line_buffered or self.__buffer_size >= self.BUFFER_SIZE:
+            self.flush()
+
+
+class Operation(object):
+    """
+    A running operation (see Reporter.operation()).
+    """
+
+    def __init__(self, reporter, resource, action, message):
+        self.__reporter = reporter
+        self.__resource = resource
+        self.__action = action
+        self.__message = message
+        self.__start = time.time()
+
+    def ok(self, detail=None):
+        self.__reporter.done(self.__resource, self.__action, self.__message, Reporter.OK,
+                             time.time() - self.__start, detail=detail)
+        return True
+
+    def failed(self, error=None):
+        self.__reporter.done(self.__resource, self.__action, self.__message, Reporter.FAILED,
+                             time.time() - self.__start, error)
+        return False
+
+    def result(self, ok, error=None):
+        return self.ok() if ok else self.failed(error)
+
+
+_reporter = None
+_reporter_lock = threading.Lock()
+
+
+def configure(fmt='text', stream=None):
+    """
+    Replaces the reporter used by all commands.
+    """
+    global _reporter
+    with _reporter_lock:
+        if _reporter is not None:
+            _reporter.flush()
+        _reporter = Reporter(fmt, stream)
+    return _reporter
+
+
+def get():
+    global _reporter
+    with _reporter_lock:
+        if _reporter is None:
+            _reporter = Reporter()
+        return _reporter
+
+
+def flush():
+    get().flush()
+
+
+def close():
+    get().close()
@@ -0,0 +1,485 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import functools
+
+from requests.exceptions import RequestException
+from cement.core import controller
+
+from scrumtools import credentials, data, error, estimate, githubapi, output, scheduler, state, transport, \
+    trelloapi
+
+
+# output actions of the provisioning tasks (by backend and task kind)
+ACTIONS = {
+    ('github',): 'read_organization',
+    ('github', 'repo'): 'create_repo',
+    ('github', 'team'): 'create_team',
+    ('github', 'link'): 'link_repo',
+    ('github', 'members'): 'read_members',
+    ('github', 'invite'): 'invite',
+    ('github', 'remove'): 'remove_member',
+    ('trello',): 'read_organization',
+    ('trello', 'board'): 'create_board',
+    ('trello', 'states'): 'read_boards',
+    ('trello', 'list'): 'create_list',
+    ('trello', 'admin'): 'add_admin',
+    ('trello', 'member'): 'add_member',
+    ('trello', 'card'): 'create_card',
+}
+
+
+class ProvisionController(controller.CementBaseController):
+    class Meta:
+        label = 'provision'
+        interface = controller.IController
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        description = "Provisions GitHub repositories and teams and Trello boards in a single pass."
+
+        config_section = 'provision'
+        config_defaults = dict()
+
+        arguments = [
+            (['-U', '--users-file'],
+             dict(action='store', metavar='FILE', dest='users_file',
+                  help='a CSV file listing all users')),
+            (['-C', '--card-name'],
+             dict(action='store', metavar='NAME', dest='card_name', default=None,
+                  help='name of a card to be added to all group boards (if missing)')),
+            (['-D', '--card-description'],
+             dict(action='store', metavar='NAME', dest='card_description', default=None,
+                  help='description of a card to be added')),
+            (['-L', '--card-list'],
+             dict(action='store', metavar='NAME', dest='card_list', default='Product Backlog',
+                  help='name of the list (in all boards) to add this card to')),
+            (['-E', '--estimate'],
+             dict(action='store_true', dest='estimate',
+                  help='only estimate the API calls of the run and check them against the remaining quota')),
+            (['-N', '--changed-only'],
+             dict(action='store_true', dest='changed_only',
+                  help='only provision the groups that changed since the last successful run')),
+            output.ARGUMENT,
+        ] + transport.ARGUMENTS
+
+    @controller.expose(hide=True, help="Provisions GitHub and Trello.")
+    def default(self):
+        self.app.log.debug('Provisioning GitHub and Trello.')
+
+        # validate required config parameters
+        if not self.app.config.get('github', 'auth_token') or not self.app.config.get('github', 'auth_id'):
+            raise error.ConfigError("Missing config parameter 'github.auth_id' and/or 'github.auth_token'! "
+                                    "Please run 'scrum-tools github authorize' first! ")
+        if not self.app.config.get('trello', 'auth_key') or not self.app.config.get('trello', 'auth_token'):
+            raise error.ConfigError("Missing config parameter 'trello.auth_key' and/or 'trello.auth_token'! "
+                                    "Please run 'scrum-tools trello authorize' first! ")
+
+        # get the users
+        user_repository = data.UserRepository(self.app.config)
+
+        card = (self.app.pargs.card_name, self.app.pargs.card_list, self.app.pargs.card_description)
+        provisioner = Provisioner(self.app.config, card if card[0] else None)
+
+        # restrict the run to the groups changed since the last successful run
+        roster_state = state.RosterState(self.app.config.get('core', 'state_file'))
+        settings = provisioner.settings()
+        fingerprints = user_repository.fingerprints()
+        changed = None
+        if self.app.pargs.changed_only:
+            changed = roster_state.changed(state.scope(self.app.config, 'provision'), settings, fingerprints)
+            if not changed:
+                output.get().info("Skipping all groups (roster unchanged since the last successful run).", 'yellow')
+                provisioner.close()
+                return
+            output.get().info("%s %d changed group(s): %s." % (
+                'Estimating' if self.app.pargs.estimate else 'Provisioning', len(changed),
+                ', '.join(sorted(changed, key=int))), 'cyan')
+
+        if self.app.pargs.estimate:
+            provisioner.close()
+            return self.__estimate(user_repository, changed)
+
+        try:
+            status = provisioner.run(user_repository, changed, report)
+        finally:
+            provisioner.close()
+
+        # record the roster only if all changes were applied
+        if summarize(status):
+            roster_state.save(state.scope(self.app.config, 'provision'), settings, fingerprints)
+
+        for pool in [provisioner.github_pool, provisioner.trello_client.credentials]:
+            for line in pool.report():
+                if len(pool) > 1:
+                    output.get().info(line, 'cyan')
+                else:
+                    self.app.log.debug(line)
+
+    def __estimate(self, user_repository, changed):
+        commands = ['create_boards'] + (['provision_card'] if self.app.pargs.card_name else [])
+        for est, pool in [estimate.github(self.app.config, user_repository, ['create_repos', 'create_teams'],
+                                          self.app.config.get('github', 'max_in_flight'), changed),
+                          estimate.trello(self.app.config, user_repository, commands, None, changed)]:
+            for line, color in est.report(pool):
+                output.get().info(line, color)
+
+
+class Provisioner(object):
+    """
+    Builds and runs the provisioning task graph for GitHub and Trello.
+
+    The API sessions and the organization state (GitHub teams and repos, Trello boards) are kept between runs, so that
+    subsequent runs only read the members of the teams and boards they touch. Call invalidate() to read the
+    organization state anew in the next run.
+
+    Provisioners that are given the same 'shared' dict use the same credential pools and API sessions for the same
+    credentials (e.g. several courses provisioned concurrently). Shared sessions are not closed by close(). The
+    'max_in_flight' limits of the first provisioner apply to all requests sent through its shared sessions, so that
+    concurrent runs do not multiply the load on the same quota.
+    """
+
+    def __init__(self, config, card=None, shared=None):
+        self.__config = config
+        self.__card = card
+        self.__shared = shared is not None
+
+        sessions = shared if shared is not None else dict()
+        github_pool = credentials.github_pool(config)
+        key = ('github',) + tuple(c.token for c in github_pool)
+        if key not in sessions:
+            sessions[key] = (github_pool, githubapi.login(github_pool, config.get('github', 'max_in_flight')))
+        self.github_pool, self.__github = sessions[key]
+
+        trello_pool = credentials.trello_pool(config)
+        key = ('trello',) + tuple((c.key, c.token) for c in trello_pool)
+        if key not in sessions:
+            sessions[key] = trelloapi.TrelloClient(trello_pool, config.get('trello', 'max_in_flight'))
+        self.trello_client = sessions[key]
+
+        self.__github_state = None
+        self.__trello_state = None
+
+    def settings(self):
+        """
+        Returns the GitHub and Trello settings that determine the provisioned structure (see state.RosterState).
+        """
+        settings = dict((section, self.__config.get_section_dict(section)) for section in ['github', 'trello'])
+        for section in settings.values():
+            for key in ['auth_id', 'auth_key', 'auth_token', 'auth_token_pool', 'read_mode', 'max_in_flight']:
+                section.pop(key, None)
+        return settings
+
+    def run(self, user_repository, changed=None, report=None):
+        """
+        Provisions all groups (or only the given changed groups) and returns the status of all tasks.
+        """
+        graph = scheduler.TaskGraph(dict(github=self.__config.get('github', 'max_in_flight'),
+                                         trello=self.__config.get('trello', 'max_in_flight')))
+        graph.add(self.__github_setup(user_repository, changed))
+        graph.add(self.__trello_setup(user_repository, changed))
+        return graph.run(report)
+
+    def invalidate(self):
+        self.__github_state = None
+        self.__trello_state = None
+
+    def close(self):
+        if not self.__shared:
+            self.trello_client.close()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # GitHub: repo -> team (or team link) -> membership
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def __github_setup(self, user_repository, changed):
+        organization = self.__config.get('github', 'organization')
+
+        def setup():
+            if self.__github_state is None:
+                org = self.__github.organization(organization)
+                if not org:
+                    raise error.TaskError("Organization '%s' not found" % organization)
+                teams = dict((t.name, t) for t in org.iter_teams())
+                repos = dict((r.name, r) for r in org.iter_repos())
+                self.__github_state = (org, teams, repos)
+            org, teams, repos = self.__github_state
+            return self.__github_tasks(org, teams, repos, user_repository, changed)
+
+        message = "%s GitHub organization '%s'" % ('Reading' if self.__github_state is None else 'Using cached',
+                                                    organization)
+        return scheduler.Task('github', message, setup, pool='github')
+
+    def __github_tasks(self, org, teams, repos, user_repository, changed):
+        # schema keys
+        key_github = self.__config.get('core', 'users_schema_key_github')
+        # teams setup
+        team_admins = self.__config.get('github', 'team_admins')
+        team_admins_group = self.__config.get('github', 'team_admins_group')
+        team_users = self.__config.get('github', 'team_users')
+        team_pattern = self.__config.get('github', 'team_pattern')
+        # repos setup
+        repo_admins = self.__config.get('github', 'repo_admins')
+        repo_users = self.__config.get('github', 'repo_users')
+        repo_pattern = self.__config.get('github', 'repo_pattern')
+
+        accounts = lambda group: set(a for a in user_repository.accounts(key_github, group) if a)
+        # the admins and users repos may coincide with each other or with a group repo
+        unique = lambda names: [n for i, n in enumerate(names) if n not in names[:i]]
+        groups = [group for group in user_repository.groups() if changed is None or group in changed]
+        group_repos = [repo_pattern % int(group) for group in groups]
+        if team_admins not in teams:
+            admins_repos = [repo_pattern % int(group) for group in user_repository.groups()]
+        else:
+            admins_repos = group_repos
+        all_repos = unique(group_repos + [repo_admins, repo_users])
+
+        # expected (name, repos, permission, members) for the group teams, the admins team and the users team
+        # (the members of the admins team are only synchronized if the admins group changed)
+        team_specs = [(team_pattern % int(group), [repo_pattern % int(group)], 'push',
+                       accounts(group))
+                      for group in groups]
+        team_specs.append((team_admins, unique([repo_admins, repo_users] + admins_repos), 'admin',
+                           accounts(team_admins_group)
+                           if changed is None or '%d' % int(team_admins_group) in changed else None))
+        team_specs.append((team_users, [repo_users], 'pull', accounts(None)))
+
+        tasks = []
+        missing_repos = set(r for r in all_repos if r not in repos)
+        repo_deps = lambda names: ['github'] + ['github:repo:%s' % r for r in names if r in missing_repos]
+
+        def create_repo(repo_name):
+            repo = org.create_repo(name=repo_name, private=True, has_wiki=False)
+            if not repo:
+                raise error.TaskError("Cannot create repository '%s'" % repo_name)
+            repos[repo_name] = repo
+
+        for repo_name in all_repos:
+            if repo_name in missing_repos:
+                tasks.append(scheduler.Task('github:repo:%s' % repo_name, "Creating repository '%s'" % repo_name,
+                                            functools.partial(create_repo, repo_name), ['github'], 'github'))
+
+        def create_team(team_name, repo_names, permission):
+            team = org.create_team(name=team_name, repo_names=repo_names, permission=permission)
+            if not team:
+                raise error.TaskError("Cannot create team '%s'" % team_name)
+            teams[team_name] = team
+
+        def add_repo(team_name, repo_name):
+            if not teams[team_name].add_repo(repo_name):
+                raise error.TaskError("Cannot add repo '%s' to team '%s'" % (repo_name, team_name))
+
+        for team_name, repo_names, permission, members_exp in team_specs:
+            full_names = ['%s/%s' % (org.login, r) for r in repo_names]
+            if team_name not in teams:
+                team_deps = ['github:team:%s' % team_name]
+                tasks.append(scheduler.Task('github:team:%s' % team_name, "Creating team '%s'" % team_name,
+                                            functools.partial(create_team, team_name, full_names, permission),
+                                            repo_deps(repo_names), 'github'))
+            else:
+                team_deps = ['github']
+                # existing repos are already linked to existing teams (by 'github create-repos' or on team creation)
+                for repo_name, full_name in zip(repo_names, full_names):
+                    if repo_name not in missing_repos:
+                        continue
+                    tasks.append(scheduler.Task('github:link:%s:%s' % (team_name, repo_name),
+                                                "Adding repo '%s' to team '%s'" % (full_name, team_name),
+                                                functools.partial(add_repo, team_name, full_name),
+                                                repo_deps([repo_name]), 'github'))
+
+            if members_exp is not None:
+                member_tasks = functools.partial(self.__github_member_tasks, teams, team_name, members_exp)
+                tasks.append(scheduler.Task('github:members:%s' % team_name,
+                                            "Reading team members for team '%s'" % team_name,
+                                            member_tasks, team_deps, 'github'))
+
+        return tasks
+
+    @staticmethod
+    def __github_member_tasks(teams, team_name, members_exp):
+        team = teams[team_name]
+        members_act = set(m.login for m in team.iter_members())
+
+        def invite(u):
+            if not team.invite(u):
+                raise error.TaskError("Cannot add '%s' to team '%s'" % (u, team_name))
+
+        def remove(u):
+            if not team.remove_member(u):
+                raise error.TaskError("Cannot remove '%s' from team '%s'" % (u, team_name))
+
+        deps = ['github:members:%s' % team_name]
+        tasks = [scheduler.Task('github:invite:%s:%s' % (team_name, u), "Adding '%s' to team '%s'" % (u, team_name),
+                                functools.partial(invite, u), deps, 'github')
+                 for u in sorted(members_exp - members_act)]
+        tasks += [scheduler.Task('github:remove:%s:%s' % (team_name, u),
+                                 "Removing '%s' from team '%s'" % (u, team_name),
+                                 functools.partial(remove, u), deps, 'github')
+                  for u in sorted(members_act - members_exp)]
+        return tasks
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Trello: board -> lists -> members -> cards
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def __trello_setup(self, user_repository, changed):
+        organization = self.__config.get('trello', 'organization')
+        client = self.trello_client
+        # board lists and members are read anew in each run
+        reader = trelloapi.BoardReader(client, self.__config.get('trello', 'read_mode'))
+
+        def setup():
+            if self.__trello_state is None:
+                try:
+                    org = client.organization(organization)
+                except RequestException:
+                    raise error.TaskError("Organization '%s' not found" % organization)
+                boards = dict((b['name'], b) for b in reader.boards(organization))
+                self.__trello_state = (org, boards)
+            org, boards = self.__trello_state
+            return self.__trello_tasks(client, reader, org, boards, user_repository, changed)
+
+        message = "%s Trello organization '%s'" % ('Reading' if self.__trello_state is None else 'Using cached',
+                                                    organization)
+        return scheduler.Task('trello', message, setup, pool='trello')
+
+    def __trello_tasks(self, client, reader, org, boards, user_repository, changed):
+        # schema keys
+        key_trello = self.__config.get('core', 'users_schema_key_trello')
+        # boards setup
+        board_admins_name = self.__config.get('trello', 'board_admins')
+        board_pattern = self.__config.get('trello', 'board_pattern')
+        board_lists = self.__config.get('trello', 'board_lists')
+        admins_group = self.__config.get('trello', 'board_admins_group')
+        # card parameters
+        card = self.__card
+
+        # the board admins are members of all boards
+        if changed is not None and '%d' % int(admins_group) in changed:
+            changed = None
+        groups = [group for group in user_repository.groups() if changed is None or group in changed]
+
+        # expected (name, admins, members, card) for the group boards and the admins board
+        accounts = lambda group: set(a for a in user_repository.accounts(key_trello, group) if a)
+        board_admins = accounts(admins_group)
+        board_specs = [(board_pattern % int(group),
+                        board_admins,
+                        accounts(group),
+                        card)
+                       for group in groups]
+        if changed is None:
+            board_specs.append((board_admins_name, board_admins, set(), None))
+
+        def create_board(board_name):
+            boards[board_name] = client.new_board(board_name, org['id'])
+
+        def board_tasks(specs, deps):
+            # the states of all given boards are read at once (batched across the boards)
+            states = reader.states([boards[board_name] for board_name, _, _, _ in specs])
+            tasks = []
+            for board_name, admins, members, board_card in specs:
+                tasks.extend(self.__trello_board_tasks(client, boards, board_name, states[boards[board_name]['id']],
+                                                       deps, board_lists, admins, members, board_card))
+            return tasks
+
+        # the existing boards are read right away, the new ones once they all have been created
+        new_specs = [spec for spec in board_specs if spec[0] not in boards]
+        tasks = board_tasks([spec for spec in board_specs if spec[0] in boards], ['trello'])
+        for board_name, _, _, _ in new_specs:
+            tasks.append(scheduler.Task('trello:board:%s' % board_name, "Creating board '%s'" % board_name,
+                                        functools.partial(create_board, board_name), ['trello'], 'trello'))
+        if new_specs:
+            message = "Reading lists and members of %d new board(s)" % len(new_specs)
+            tasks.append(scheduler.Task('trello:states', message,
+                                        functools.partial(board_tasks, new_specs, ['trello:states']),
+                                        ['trello:board:%s' % board_name for board_name, _, _, _ in new_specs],
+                                        'trello'))
+        return tasks
+
+    @staticmethod
+    def __trello_board_tasks(client, boards, board_name, state, deps, board_lists, admins, members, card):
+        board = boards[board_name]
+        lists = dict((l['name'], l) for l in state.lists)
+        # explicit positions keep the configured order of the missing lists although they are added concurrently
+        pos = max([l.get('pos', 0) for l in state.lists] or [0])
+
+        def new_list(list_name, list_pos):
+            lists[list_name] = client.new_list(list_name, board['id'], list_pos)
+
+        def add_member(u, member_type):
+            client.add_board_member(board['id'], u, member_type)
+
+        def new_card(card_name, card_list, card_desc):
+            cards = client.get('/boards/%s/cards' % board['id'], fields='name,idList')
+            if not any(c['name'] == card_name and c['idList'] == lists[card_list]['id'] for c in cards):
+                client.new_card(card_name, lists[card_list]['id'], card_desc)
+
+        tasks = []
+        for list_name in [l for l in board_lists if l not in lists]:
+            pos += 1024
+            tasks.append(scheduler.Task('trello:list:%s:%s' % (board_name, list_name),
+                                        "Adding list '%s' to board '%s'" % (list_name, board_name),
+                                        functools.partial(new_list, list_name, pos), deps, 'trello'))
+        for u in sorted(admins - state.admins):
+            tasks.append(scheduler.Task('trello:admin:%s:%s' % (board_name, u),
+                                        "Adding '%s' as admin member of '%s'" % (u, board_name),
+                                        functools.partial(add_member, u, 'admin'),
+                                        deps, 'trello'))
+        for u in sorted(members - state.members):
+            tasks.append(scheduler.Task('trello:member:%s:%s' % (board_name, u),
+                                        "Adding '%s' as normal member of '%s'" % (u, board_name),
+                                        functools.partial(add_member, u, 'normal'),
+                                        deps, 'trello'))
+        if card:
+            card_name, card_list, card_desc = card
+            if card_list in lists or card_list in board_lists:
+                card_deps = deps + [t.name for t in tasks if t.name == 'trello:list:%s:%s' % (board_name, card_list)]
+                tasks.append(scheduler.Task('trello:card:%s' % board_name,
+                                            "Adding card to list '%s' in '%s'" % (card_list, board_name),
+                                            functools.partial(new_card, card_name, card_list, card_desc),
+                                            card_deps, 'trello'))
+        return tasks
+
+
+def report(task, status, e, course=None):
+    """
+    Reports a finished task of the provisioning graph (see output.Reporter). The resources and messages of a course
+    are prefixed with its label.
+    """
+    # task names are '<backend>[:<kind>[:<resource>]]', e.g. 'github:invite:<team>:<user>'
+    parts = task.name.split(':', 2)
+    action = ACTIONS.get(tuple(parts[:2]), task.name)
+    resource = parts[2] if len(parts) > 2 else parts[0]
+    message = task.message
+    if status == scheduler.TaskGraph.SKIPPED:
+        message = "Skipping: %s (a prerequisite failed)." % message
+    if course is not None:
+        resource, message = "%s/%s" % (course, resource), "[%s] %s" % (course, message)
+    output.get().done(resource, action, message, status, task.latency, e)
+
+
+def summarize(status):
+    """
+    Prints the task counts of a provisioning run and returns True if all tasks succeeded.
+    """
+    ok, failed, skipped = [status.values().count(s) for s in [scheduler.TaskGraph.OK, scheduler.TaskGraph.FAILED,
+                                                              scheduler.TaskGraph.SKIPPED]]
+    output.get().info("Provisioning finished: %d OK, %d not OK, %d skipped." % (ok, failed, skipped),
+                      'green' if not failed else 'red', attrs=['bold'])
+    return not failed and not skipped
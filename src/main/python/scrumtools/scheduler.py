@@ -0,0 +1,166 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from scrumtools import error
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class Task(object):
+    """
+    A unit of work in a TaskGraph.
+
+    The function of a task may return a list of further tasks, which are added to the graph once it succeeds (any
+    other result than None or a list of tasks fails the task).
+    The execution time of the function (in seconds) is recorded as latency.
+    """
+
+    def __init__(self, name, message, fn, deps=(), pool=None):
+        self.name = name
+        self.message = message
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.pool = pool
+        self.latency = None
+
+
+class TaskGraph(object):
+    """
+    A graph of tasks with dependencies, executed on a shared worker pool.
+
+    A task is started once all of its dependencies have finished. If one of them did not succeed, the task is skipped.
+    The number of concurrently running tasks is limited per pool (e.g. one pool per backend).
+    """
+
+    OK = 'ok'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    WAIT_TIMEOUT = 1  # waiting with a timeout keeps the main thread responsive to signals
+
+    def __init__(self, limits):
+        self.__limits = dict((pool, max(1, int(limit))) for pool, limit in limits.items())
+        self.__tasks = dict()
+        self.__status = dict()
+        self.__waiting = dict()
+        self.__dependents = dict()
+        self.__ready = dict((pool, deque()) for pool in self.__limits)
+
+    def __contains__(self, name):
+        return name in self.__tasks
+
+    def add(self, task):
+        if task.name in self.__tasks:
+            raise ValueError("Duplicate task '%s'" % task.name)
+        if task.pool not in self.__limits:
+            raise ValueError("Unknown pool '%s' for task '%s'" % (task.pool, task.name))
+        for dep in task.deps:
+            if dep not in self.__tasks:
+                raise ValueError("Task '%s' depends on unknown task '%s'" % (task.name, dep))
+
+        self.__tasks[task.name] = task
+        self.__dependents[task.name] = []
+        self.__waiting[task.name] = 0
+        for dep in task.deps:
+            self.__dependents[dep].append(task.name)
+            if dep not in self.__status:
+                self.__waiting[task.name] += 1
+        if not self.__waiting[task.name]:
+            self.__ready[task.pool].append(task.name)
+        return task.name
+
+    def run(self, report=None):
+        """
+        Runs all tasks and returns a dict that maps task names to their status (OK, FAILED or SKIPPED).
+
+        The report(task, status, error) callback is invoked from the calling thread whenever a task finishes.
+        """
+        done = queue.Queue()
+        running = dict((pool, 0) for pool in self.__limits)
+
+        def execute(task):
+            start = time.time()
+            try:
+                result = task.fn()
+                task.latency = time.time() - start
+                if result is not None and (not isinstance(result, list) or
+                                           not all(isinstance(child, Task) for child in result)):
+                    raise error.TaskError("Task '%s' returned %r instead of a list of tasks" % (task.name, result))
+                done.put((task, self.OK, None, result))
+            except Exception as e:
+                task.latency = time.time() - start
+                done.put((task, self.FAILED, e, None))
+
+        workers = ThreadPool(sum(self.__limits.values()))
+        try:
+            while True:
+                # start all ready tasks that fit into their pool and skip those with unsuccessful dependencies
+                # (skipping a task may make tasks in other pools ready, so repeat until nothing changes)
+                progress = True
+                while progress:
+                    progress = False
+                    for pool, ready in self.__ready.items():
+                        while ready:
+                            task = self.__tasks[ready[0]]
+                            if any(self.__status[dep] != self.OK for dep in task.deps):
+                                ready.popleft()
+                                self.__finish(task, self.SKIPPED, None, report)
+                            elif running[pool] < self.__limits[pool]:
+                                ready.popleft()
+                                running[pool] += 1
+                                workers.apply_async(execute, (task,))
+                            else:
+                                break
+                            progress = True
+
+                if not any(running.values()):
+                    break
+
+                try:
+                    task, status, e, result = done.get(True, self.WAIT_TIMEOUT)
+                except queue.Empty:
+                    continue
+
+                running[task.pool] -= 1
+                if status == self.OK:
+                    for child in result or []:
+                        self.add(child)
+                self.__finish(task, status, e, report)
+        finally:
+            workers.close()
+            workers.join()
+
+        return dict(self.__status)
+
+    def __finish(self, task, status, e, report):
+        self.__status[task.name] = status
+        if report:
+            report(task, status, e)
+        for name in self.__dependents[task.name]:
+            self.__waiting[name] -= 1
+            if not self.__waiting[name]:
+                self.__ready[self.__tasks[name].pool].append(name)
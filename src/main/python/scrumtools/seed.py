@@ -0,0 +1,110 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import os
+import re
+import shutil
+import tempfile
+import subprocess
+
+from scrumtools import error
+
+
+class RepoSeed(object):
+    """
+    The starter content of the group repositories, built once as a single commit and pushed to each repository.
+
+    The template is either a plain directory, whose files are committed into a temporary bare repository (and packed
+    once, so that all pushes reuse the compressed objects), or a git repository, whose 'branch' is pushed as it is.
+    Repositories that already have the branch are not changed. Requires the git command line client.
+
+    The commit of a plain directory has a fixed date, so that the same files, message and author always yield the same
+    commit (and already seeded repositories can be recognized by it).
+    """
+
+    AUTHOR_PATTERN = re.compile(r'^\s*(.*?)\s*<(.*)>\s*$')
+    COMMIT_DATE = '946684800 +0000'  # 2000-01-01T00:00:00Z
+
+    def __init__(self, template, branch='master', message='Initial commit',
+                 author='scrum-tools <scrum-tools@localhost>'):
+        template = os.path.abspath(os.path.expanduser(template))
+        if not os.path.isdir(template):
+            raise error.ConfigError("Template directory '%s' not found" % template)
+        match = self.AUTHOR_PATTERN.match(author or '')
+        if not match:
+            raise error.ConfigError("Invalid seed author '%s' (expected 'Name <email>')" % author)
+
+        self.branch = branch
+        self.__tmp = None
+        git_dir = os.path.join(template, '.git')
+        if not os.path.isdir(git_dir) and os.path.isfile(os.path.join(template, 'HEAD')):
+            git_dir = template  # a bare repository
+
+        if os.path.isdir(os.path.join(git_dir, 'objects')):
+            # a non-bare or bare repository: push its branch
+            self.__git_dir = git_dir
+            self.commit = self.__git('rev-parse', '--verify', 'refs/heads/%s^{commit}' % branch).strip()
+        else:
+            # a plain directory: commit its files into a temporary repository
+            self.__tmp = tempfile.mkdtemp(prefix='scrum-tools-seed-')
+            self.__git_dir = self.__tmp
+            env = dict(GIT_WORK_TREE=template, GIT_INDEX_FILE=os.path.join(self.__tmp, 'seed.index'),
+                       GIT_AUTHOR_NAME=match.group(1), GIT_AUTHOR_EMAIL=match.group(2),
+                       GIT_COMMITTER_NAME=match.group(1), GIT_COMMITTER_EMAIL=match.group(2),
+                       GIT_AUTHOR_DATE=self.COMMIT_DATE, GIT_COMMITTER_DATE=self.COMMIT_DATE)
+            try:
+                self.__git('init', '--quiet', '--bare')
+                self.__git('add', '--all', '.', env=env, cwd=template)
+                tree = self.__git('write-tree', env=env).strip()
+                self.commit = self.__git('commit-tree', '--no-gpg-sign', tree, '-m', message, env=env).strip()
+                self.__git('update-ref', 'refs/heads/%s' % branch, self.commit)
+                self.__git('repack', '-a', '-d', '-q')
+            except error.GitError:
+                self.close()
+                raise
+
+    def state(self, url):
+        """
+        Returns the commit of the branch in the given remote repository (None if the branch does not exist).
+        """
+        refs = self.__git('ls-remote', url, 'refs/heads/%s' % self.branch).split()
+        return refs[0] if refs else None
+
+    def push(self, url):
+        self.__git('push', '--quiet', url, '%s:refs/heads/%s' % (self.commit, self.branch))
+
+    def close(self):
+        if self.__tmp is not None:
+            shutil.rmtree(self.__tmp, ignore_errors=True)
+            self.__tmp = None
+
+    def __git(self, *args, **kwargs):
+        env = dict(os.environ, GIT_DIR=self.__git_dir, GIT_TERMINAL_PROMPT='0', **kwargs.get('env', {}))
+        try:
+            process = subprocess.Popen(['git'] + list(args), cwd=kwargs.get('cwd'), env=env,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise error.GitError("Cannot run git (%s)" % e.strerror)
+        out, err = process.communicate()
+        if process.returncode != 0:
+            messages = [line for line in err.splitlines() if line.startswith('fatal: ') or line.startswith('error: ')]
+            raise error.GitError("git %s failed (%s)" % (args[0], messages[0].split(': ', 1)[1] if messages else
+                                                         'exit code %d' % process.returncode))
+        return out
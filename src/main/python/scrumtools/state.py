@@ -0,0 +1,87 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import hashlib
+import threading
+
+
+# serializes the updates of state files by concurrently running commands (e.g. several courses)
+LOCK = threading.Lock()
+
+
+def scope(config, command):
+    """
+    Returns the state scope of a command for the course given by the users file of the config.
+    """
+    return '%s:%s' % (command, os.path.abspath(os.path.expanduser(config.get('core', 'users_file'))))
+
+
+class RosterState(object):
+    """
+    The roster fingerprints recorded after the last successful run of each command.
+
+    A fingerprint consists of a hash of the command settings and a hash of the members of each group (see
+    UserRepository.fingerprints()). The fingerprints are stored as a JSON file under one scope per command and course
+    (see scope()).
+    """
+
+    def __init__(self, path):
+        self.__path = os.path.expanduser(path)
+        self.__scopes = self.__read()
+
+    def changed(self, scope, settings, fingerprints):
+        """
+        Returns the set of groups whose fingerprint differs from the one recorded for the given scope. All groups are
+        considered changed if the settings differ or nothing has been recorded yet.
+        """
+        recorded = self.__scopes.get(scope)
+        if not recorded or recorded.get('settings') != self.settings_hash(settings):
+            return set(fingerprints)
+        groups = recorded.get('groups', dict())
+        return set(g for g, h in fingerprints.iteritems() if groups.get(g) != h)
+
+    def save(self, scope, settings, fingerprints):
+        with LOCK:
+            # merge with the scopes saved by other commands in the meantime
+            self.__scopes = self.__read()
+            self.__scopes[scope] = dict(settings=self.settings_hash(settings), groups=fingerprints)
+
+            directory = os.path.dirname(self.__path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            # write a temporary file first, so that an interrupted run cannot leave a truncated state file behind
+            with open(self.__path + '.tmp', 'w') as f:
+                json.dump(self.__scopes, f, indent=2, sort_keys=True)
+            os.rename(self.__path + '.tmp', self.__path)
+
+    def __read(self):
+        if not os.path.isfile(self.__path):
+            return dict()
+        try:
+            with open(self.__path, 'r') as f:
+                return json.load(f)
+        except ValueError as e:
+            raise RuntimeError("Cannot read roster state file '%s': %s" % (self.__path, e))
+
+    @staticmethod
+    def settings_hash(settings):
+        return hashlib.sha1(json.dumps(settings, sort_keys=True)).hexdigest()
@@ -0,0 +1,307 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import gzip
+import time
+import base64
+import datetime
+import threading
+from collections import deque
+from contextlib import closing
+from urllib import urlencode
+from urlparse import urlsplit, urlunsplit, parse_qsl
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from scrumtools import error
+
+
+# query, form and JSON parameters holding credentials (redacted in the recorded requests)
+SECRET_PARAMS = frozenset(['key', 'token', 'access_token', 'client_id', 'client_secret', 'password'])
+# response headers which are not recorded
+SECRET_HEADERS = frozenset(['set-cookie'])
+REDACTED = 'REDACTED'
+
+# the arguments selecting the transport (shared by all controllers issuing API requests; override 'core.http_*')
+ARGUMENTS = [
+    (['--record'],
+     dict(action='store', metavar='FILE', dest='http_record',
+          help='record all HTTP requests and responses to a file (credentials are redacted, *.gz is compressed)')),
+    (['--replay'],
+     dict(action='store', metavar='FILE', dest='http_replay',
+          help='serve all HTTP requests from a recorded file instead of the network')),
+    (['--replay-latency'],
+     dict(action='store', metavar='FACTOR', dest='http_replay_latency', type=float,
+          help='factor applied to the recorded latencies on replay (1 = original, 0 = none)')),
+]
+
+
+class Recorder(object):
+    """
+    Writes the HTTP exchanges of a run to a file, one JSON record per line (gzip-compressed if the file name ends with
+    '.gz').
+
+    A record holds the method, the URL and the body of the request (with credentials redacted), the start offset and
+    the latency of the exchange, and either the status, headers and content of the response or the transport error.
+    """
+
+    def __init__(self, path):
+        try:
+            self.__file = _open(path, 'wb')
+        except IOError as e:
+            raise error.ConfigError("Cannot open record file '%s' (%s)" % (path, e.strerror))
+        self.__lock = threading.Lock()
+        self.__start = time.time()
+
+    def record(self, request, start, elapsed, response=None, e=None):
+        record = dict(method=request.method, url=redact_url(request.url), body=redact_body(request.body),
+                      offset=round(start - self.__start, 4), elapsed=round(elapsed, 4))
+        if response is not None:
+            record.update(status=response.status_code, reason=response.reason,
+                          headers=dict((k, v) for k, v in response.headers.items() if k.lower() not in SECRET_HEADERS))
+            content = response.content or ''
+            try:
+                content = content.decode('utf-8')
+            except UnicodeDecodeError:
+                record['content_base64'] = base64.b64encode(content)
+            else:
+                # responses may echo the credentials of the request
+                record['content'] = redact_text(content, request)
+        else:
+            # transport errors quote the request URL
+            message = '%s' % e
+            if isinstance(message, str):
+                message = message.decode('utf-8', 'replace')
+            record['error'] = redact_text(message, request)
+
+        line = json.dumps(record, sort_keys=True, separators=(',', ':'))
+        with self.__lock:
+            self.__file.write(line + '\n')
+
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+
+class Player(object):
+    """
+    Serves HTTP requests from a file written by a Recorder.
+
+    Requests are matched by method, URL and body (after redaction, so the credentials of the replaying run do not
+    matter). Identical requests are answered in the recorded order; once only the last recorded response is left, it
+    is repeated. Each response is delayed by its recorded latency multiplied by the given factor.
+    """
+
+    def __init__(self, path, latency=1.0):
+        self.__latency = max(0.0, float(latency))
+        self.__lock = threading.Lock()
+        self.__exchanges = dict()
+        try:
+            with closing(_open(path, 'rb')) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        key = (record['method'], record['url'], record.get('body'))
+                        self.__exchanges.setdefault(key, deque()).append(record)
+        except IOError as e:
+            raise error.ConfigError("Cannot read replay file '%s' (%s)" % (path, e.strerror))
+        except (ValueError, KeyError) as e:
+            raise error.ConfigError("Invalid replay file '%s' (%s)" % (path, e))
+
+    def play(self, request, adapter):
+        url = redact_url(request.url)
+        with self.__lock:
+            records = self.__exchanges.get((request.method, url, redact_body(request.body)))
+            if not records:
+                raise ConnectionError("No recorded response for %s %s" % (request.method, url), request=request)
+            record = records.popleft() if len(records) > 1 else records[0]
+
+        delay = record['elapsed'] * self.__latency
+        time.sleep(delay)
+        if 'error' in record:
+            raise ConnectionError(record['error'], request=request)
+
+        response = Response()
+        response.status_code = record['status']
+        response.reason = record.get('reason')
+        response.headers = CaseInsensitiveDict(record.get('headers', {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        response.elapsed = datetime.timedelta(seconds=delay)
+        if 'content_base64' in record:
+            response._content = base64.b64decode(record['content_base64'])
+        else:
+            response._content = record.get('content', u'').encode('utf-8')
+        return response
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    An HTTP adapter that passes all exchanges to a Recorder.
+    """
+
+    def __init__(self, recorder, **kwargs):
+        self.recorder = recorder
+        super(RecordingAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        try:
+            response = super(RecordingAdapter, self).send(request, **kwargs)
+            # streamed responses are read at once, so that they can be recorded with the exchange
+            response.content
+        except RequestException as e:
+            self.recorder.record(request, start, time.time() - start, e=e)
+            raise
+        self.recorder.record(request, start, time.time() - start, response)
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    An HTTP adapter that serves all requests from a Player (without network access).
+    """
+
+    def __init__(self, player, **kwargs):
+        self.player = player
+        super(ReplayAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        return self.player.play(request, self)
+
+
+def redact_url(url):
+    """
+    Returns the given URL with redacted credential parameters and sorted query parameters.
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    params = sorted((k, REDACTED if k in SECRET_PARAMS else v) for k, v in parse_qsl(query, keep_blank_values=True))
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment))
+
+
+def secrets(request):
+    """
+    Returns the credentials sent with the given request (parameter values and the 'Authorization' header token).
+    """
+    values = set(v for k, v in parse_qsl(urlsplit(request.url).query) if k in SECRET_PARAMS)
+    if isinstance(request.body, basestring):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            values.update(v for k, v in parse_qsl(request.body) if k in SECRET_PARAMS)
+        else:
+            if isinstance(data, dict):
+                values.update(v for k, v in data.items() if k in SECRET_PARAMS and isinstance(v, basestring))
+    authorization = request.headers.get('Authorization')
+    if authorization:
+        values.add(authorization.split()[-1])
+    # short values (e.g. placeholders) are skipped, as replacing them would garble the content
+    return [v.decode('utf-8', 'replace') if isinstance(v, str) else v for v in values if len(v) >= 8]
+
+
+def redact_text(text, request):
+    """
+    Returns the given text with the credentials of the given request redacted.
+    """
+    for secret in secrets(request):
+        text = text.replace(secret, REDACTED)
+    return text
+
+
+def redact_body(body):
+    """
+    Returns the given request body (JSON or form encoded) with redacted credential parameters.
+    """
+    if not body or not isinstance(body, basestring):
+        return None  # streamed bodies (e.g. file uploads) are not recorded
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        try:
+            params = parse_qsl(body, keep_blank_values=True, strict_parsing=True)
+        except ValueError:
+            return body.decode('utf-8', 'replace')
+        return urlencode(sorted((k, REDACTED if k in SECRET_PARAMS else v) for k, v in params))
+
+    if isinstance(data, dict):
+        data = dict((k, REDACTED if k in SECRET_PARAMS else v) for k, v in data.items())
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def _open(path, mode):
+    path = os.path.expanduser(path)
+    return gzip.open(path, mode) if path.endswith('.gz') else open(path, mode)
+
+
+_recorder = None
+_player = None
+_lock = threading.Lock()
+
+
+def configure(record=None, replay=None, latency=1.0):
+    """
+    Selects the transport of all sessions mounted afterwards: recording to the 'record' file, replaying from the
+    'replay' file, or plain network access (if neither is given).
+    """
+    global _recorder, _player
+    if record and replay:
+        raise error.ConfigError("The '--record' and '--replay' options cannot be combined!")
+
+    close()
+    with _lock:
+        _recorder = Recorder(record) if record else None
+        _player = Player(replay, latency) if replay else None
+
+
+def mount(session, **kwargs):
+    """
+    Mounts the configured transport on the given requests session. The keyword arguments are passed to the HTTP
+    adapter (e.g. the connection pool size).
+    """
+    with _lock:
+        if _player is not None:
+            adapter = ReplayAdapter(_player, **kwargs)
+        elif _recorder is not None:
+            adapter = RecordingAdapter(_recorder, **kwargs)
+        else:
+            adapter = HTTPAdapter(**kwargs)
+    for prefix in ['https://', 'http://']:
+        session.mount(prefix, adapter)
+    return session
+
+
+def close():
+    global _recorder, _player
+    with _lock:
+        if _recorder is not None:
+            _recorder.close()
+        _recorder = None
+        _player = None
@@ -19,16 +19,15 @@ Created on Apr 13, 2014
 from __future__ import absolute_import
 
 import os
-import json
-import sys
+import time
+import functools
 
-import requests
 from requests.exceptions import RequestException
 from cement.core import controller
-from termcolor import cprint, colored
+from termcolor import cprint
 from trello import TrelloApi
 
-from scrumtools import data, error
+from scrumtools import credentials, data, error, estimate, output, state, transport, trelloapi
 
 
 try:
@@ -49,11 +48,14 @@ class TrelloController(controller.CementBaseController):
         config_defaults = dict(
             auth_key=None,
             auth_token=None,
+            auth_token_pool=None,
             organization='example.org',
             board_admins='example',
             board_pattern='example.g%02d',
             board_admins_group=0,
             board_lists=['Product Backlog', 'To Do', 'Doing', 'Done'],
+            read_mode='batch',
+            max_in_flight=8,
         )
 
         arguments = [
@@ -72,7 +74,20 @@ class TrelloController(controller.CementBaseController):
             (['-L', '--card-list'],
              dict(action='store', metavar='NAME', dest='card_list', default='Product Backlog',
                   help='name of the list (in all boards) to add this card to')),
-        ]
+            (['-R', '--read-mode'],
+             dict(action='store', metavar='MODE', dest='read_mode', choices=trelloapi.BoardReader.MODES,
+                  help='how to read board lists and members (%s)' % ', '.join(trelloapi.BoardReader.MODES))),
+            (['-J', '--max-in-flight'],
+             dict(action='store', metavar='N', dest='max_in_flight', type=int,
+                  help='maximum number of concurrent Trello requests')),
+            (['-E', '--estimate'],
+             dict(action='store_true', dest='estimate',
+                  help='only estimate the API calls of the command and check them against the rate limits')),
+            (['-N', '--changed-only'],
+             dict(action='store_true', dest='changed_only',
+                  help='only update the boards of groups that changed since the last successful run')),
+            output.ARGUMENT,
+        ] + transport.ARGUMENTS
 
     @controller.expose(hide=True)
     def default(self):
@@ -114,23 +129,36 @@ class TrelloController(controller.CementBaseController):
         # get the users
         user_repository = data.UserRepository(self.app.config)
         # create trello session
-        tl = TrelloApi(self.app.config.get('trello', 'auth_key'), self.app.config.get('trello', 'auth_token'))
+        client = self.__client()
 
-        for u in user_repository.users():
+        def validate(u):
             if not u[key_trello]:
-                cprint("Skipping empty Trello account for user '%s'." % u[key_username], 'yellow', file=sys.stdout)
-                continue
-
-            print colored("Validating Trello account '%s' for user '%s'..." % (u[key_trello], u[key_username]), 'green'),
+                return u, None, None
+            start = time.time()
             try:
-                trello_user = tl.members.get(u[key_trello])
-                if u[key_trello] != trello_user['username']:
-                    print colored('OK (but should be %s)' % trello_user['username'], 'yellow', attrs=['bold'])
-                else:
-                    print colored('OK', 'green', attrs=['bold'])
-
+                return u, client.member(u[key_trello]), time.time() - start
             except RequestException:
-                print colored('Not OK', 'red', attrs=['bold'])
+                return u, False, time.time() - start
+
+        out = output.get()
+        try:
+            for u, trello_user, latency in client.map(validate, list(user_repository.users())):
+                if trello_user is None:
+                    out.skip(u[key_username], 'validate_user',
+                             "Skipping empty Trello account for user '%s'." % u[key_username])
+                    continue
+
+                message = "Validating Trello account '%s' for user '%s'" % (u[key_trello], u[key_username])
+                if not trello_user:
+                    out.done(u[key_trello], 'validate_user', message, out.FAILED, latency)
+                elif u[key_trello] != trello_user['username']:
+                    out.done(u[key_trello], 'validate_user', message, out.OK, latency,
+                             detail='but should be %s' % trello_user['username'])
+                else:
+                    out.done(u[key_trello], 'validate_user', message, out.OK, latency)
+        finally:
+            client.close()
+            self.__report_quota(client.credentials)
 
     @controller.expose(help="Creates Trello boards.")
     def create_boards(self):
@@ -142,7 +170,6 @@ class TrelloController(controller.CementBaseController):
                                     "Please run 'scrum-tools trello authorize' first! ")
 
         # schema keys
-        key_group = self.app.config.get('core', 'users_schema_key_group')
         key_trello = self.app.config.get('core', 'users_schema_key_trello')
         # organization
         organization = self.app.config.get('trello', 'organization')
@@ -154,28 +181,75 @@ class TrelloController(controller.CementBaseController):
 
         # get the users
         user_repository = data.UserRepository(self.app.config)
-        # create trello session
-        tl = TrelloApi(self.app.config.get('trello', 'auth_key'), self.app.config.get('trello', 'auth_token'))
-
-        # get the organization
-        org = tl.organizations.get(organization)
-        if not org:
-            raise RuntimeError("Organization '%s' not found" % organization)
 
-        # get all organization boards
-        boards = dict((b['name'], b) for b in tl.organizations.get_board(organization))
+        if self.app.pargs.estimate:
+            return self.__estimate(['create_boards'], user_repository)
+
+        # restrict the run to the groups changed since the last successful run
+        roster_state = state.RosterState(self.app.config.get('core', 'state_file'))
+        settings = [organization, board_admins_name, board_pattern, board_lists, admins_group]
+        fingerprints = user_repository.fingerprints()
+        changed = roster_state.changed(state.scope(self.app.config, 'trello.create_boards'), settings, fingerprints)
+        groups = list(user_repository.groups())
+        if self.app.pargs.changed_only:
+            if not changed:
+                output.get().info("Skipping all boards (roster unchanged since the last successful run).", 'yellow')
+                return
+            # the board admins are members of all boards
+            if '%d' % int(admins_group) not in changed:
+                groups = [group for group in groups if group in changed]
+            output.get().info("Updating boards for %d changed group(s): %s." % (len(groups), ', '.join(groups)),
+                              'cyan')
 
-        # create group boards
-        for group in user_repository.groups():
-            board_name = board_pattern % int(group)
-            board_admins = set(u[key_trello] for u in user_repository.users(lambda x: x[key_group] == admins_group))
-            board_members = set(u[key_trello] for u in user_repository.users(lambda x: x[key_group] == group))
-            self.__create_board(tl, org, board_name, set(board_lists), board_admins, board_members, boards)
+        # create trello session
+        client = self.__client()
+        reader = trelloapi.BoardReader(client, self.app.config.get('trello', 'read_mode'))
 
-        # create admins board
-        board_admins = set(u[key_trello] for u in user_repository.users(lambda x: x[key_group] == admins_group))
-        board_members = set()
-        self.__create_board(tl, org, board_admins_name, set(board_lists), board_admins, board_members, boards)
+        try:
+            # get the organization
+            org = self.__organization(client, organization)
+
+            # get all organization boards
+            boards = dict((b['name'], b) for b in reader.boards(organization))
+
+            # expected (name, admins, members) for the group boards and the admins board
+            # users without a Trello account are not added
+            accounts = lambda group: set(a for a in user_repository.accounts(key_trello, group) if a)
+            board_admins = accounts(admins_group)
+            board_specs = [(board_pattern % int(group),
+                            board_admins,
+                            accounts(group))
+                           for group in groups]
+            if not self.app.pargs.changed_only or '%d' % int(admins_group) in changed:
+                board_specs.append((board_admins_name, board_admins, set()))
+
+            # create missing boards
+            for board_name, _, _ in board_specs:
+                if board_name in boards:
+                    output.get().skip(board_name, 'create_board',
+                                      "Skipping board '%s' (already exists)." % board_name)
+            ok = self.__run(client, [(board_name, 'create_board', "Creating board '%s'" % board_name,
+                                      self.__create_board(client, org, board_name, boards))
+                                     for board_name, _, _ in board_specs if board_name not in boards])
+
+            # read the lists and members of all boards at once
+            states = reader.states([boards[board_name] for board_name, _, _ in board_specs if board_name in boards])
+
+            # add missing lists and members
+            tasks = []
+            for board_name, board_admins, board_members in board_specs:
+                if board_name in boards:
+                    board = boards[board_name]
+                    tasks.extend(self.__update_board(client, board, states[board['id']],
+                                                     board_lists, board_admins, board_members))
+            ok &= self.__run(client, tasks)
+
+            # record the roster only if all changes were applied
+            if ok:
+                roster_state.save(state.scope(self.app.config, 'trello.create_boards'), settings, fingerprints)
+        finally:
+            client.close()
+            self.__report_quota(client.credentials)
 
     @controller.expose(help="Creates Trello boards.")
     def create_card(self):
@@ -200,82 +274,111 @@ class TrelloController(controller.CementBaseController):
 
         # get the users
         user_repository = data.UserRepository(self.app.config)
-        # create trello session
-        tl = TrelloApi(self.app.config.get('trello', 'auth_key'), self.app.config.get('trello', 'auth_token'))
-
-        # get the organization
-        org = tl.organizations.get(organization)
-        if not org:
-            raise RuntimeError("Organization '%s' not found" % organization)
-
-        # get all user group boards
-        board_names = [board_pattern % int(group) for group in user_repository.groups()]
-        boards = [b for b in tl.organizations.get_board(organization) if b['name'] in board_names]
-
-        # add new card to all boards
-        for board in boards:
-            # get lists for this board
-            board_lists = dict([(l['name'], l) for l in tl.boards.get_list(board['id'])])
 
-            # skip if given card list does not exist in board
-            if not card_list in board_lists:
-                print colored("Skipping board '%s' (no list found)..." % (board['name']), 'green', attrs=['bold']),
-                continue
+        if self.app.pargs.estimate:
+            return self.__estimate(['create_card'], user_repository, card_list)
 
-            print colored("Adding card to list '%s' in '%s'..." % (card_list, board['name']), 'green', attrs=['bold']),
-            try:
-                tl.cards.new(name=card_name, idList=[board_lists[card_list]['id']], desc=card_desc)
-                print colored('OK', 'green', attrs=['bold'])
-            except RequestException:
-                print colored('Not OK', 'red', attrs=['bold'])
-
-    def __add_board_member(self, board, member, member_type):
-        p = dict(key=self.app.config.get('trello', 'auth_key'), token=self.app.config.get('trello', 'auth_token'))
-        d = dict(type=member_type)
+        # create trello session
+        client = self.__client()
+        reader = trelloapi.BoardReader(client, self.app.config.get('trello', 'read_mode'))
 
-        print colored("Adding '%s' as %s member of '%s'..." % (member, member_type, board['name']),
-                      'green', attrs=['bold']),
         try:
-            resp = requests.put("https://trello.com/1/boards/%s/members/%s" % (board['id'], member), params=p, data=d)
-            resp.raise_for_status()
-            json.loads(resp.content)
-            print colored('OK', 'green', attrs=['bold'])
+            # get the organization
+            self.__organization(client, organization)
+
+            # get all user group boards
+            board_names = [board_pattern % int(group) for group in user_repository.groups()]
+            boards = [b for b in reader.boards(organization) if b['name'] in board_names]
+            states = reader.states(boards)
+
+            # add new card to all boards
+            tasks = []
+            for board in boards:
+                # get lists for this board
+                board_lists = dict([(l['name'], l) for l in states[board['id']].lists])
+
+                # skip if given card list does not exist in board
+                if not card_list in board_lists:
+                    output.get().skip(board['name'], 'create_card',
+                                      "Skipping board '%s' (no list found)." % board['name'])
+                    continue
+
+                tasks.append((board['name'], 'create_card',
+                              "Adding card to list '%s' in '%s'" % (card_list, board['name']),
+                              functools.partial(client.new_card, card_name, board_lists[card_list]['id'], card_desc)))
+            self.__run(client, tasks)
+        finally:
+            client.close()
+            self.__report_quota(client.credentials)
+
+    def __estimate(self, commands, user_repository, card_list=None):
+        est, pool = estimate.trello(self.app.config, user_repository, commands, card_list)
+        for line, color in est.report(pool):
+            output.get().info(line, color)
+
+    def __client(self):
+        return trelloapi.TrelloClient(credentials.trello_pool(self.app.config),
+                                      self.app.config.get('trello', 'max_in_flight'))
+
+    def __report_quota(self, pool):
+        for line in pool.report():
+            if len(pool) > 1:
+                output.get().info(line, 'cyan')
+            else:
+                self.app.log.debug(line)
+
+    @staticmethod
+    def __organization(client, organization):
+        try:
+            return client.organization(organization)
         except RequestException:
-            print colored('Not OK', 'red', attrs=['bold'])
-
-    def __create_board(self, tl, org, board_name, board_lists, board_admins, board_members, boards):
-        if not board_name in boards:
-            print colored("Creating board '%s'..." % board_name, 'green'),
-
-            try:
-                board = tl.boards.new(name=board_name, idOrganization=org['id'])
-                boards[board_name] = board
-                print colored('OK', 'green', attrs=['bold'])
-            except RequestException:
-                print colored('Not OK', 'red', attrs=['bold'])
-        else:
-            print colored("Skipping board '%s' (already exists)." % board_name, 'yellow')
-
-        board = boards[board_name]
-
-        board_lists_curr = set(l['name'] for l in tl.boards.get_list(board['id']))
+            raise RuntimeError("Organization '%s' not found" % organization)
 
-        print colored("Adding missing lists to board '%s'" % board_name, 'green', attrs=['bold'])
-        for list_name in board_lists - board_lists_curr:
-            print colored("Adding list '%s' to board '%s'..." % (list_name, board['name']), 'green', attrs=['bold']),
+    @staticmethod
+    def __run(client, tasks):
+        """
+        Runs the given (resource, action, message, function) tasks concurrently and reports their outcome in the given
+        order. Returns True if all tasks succeeded.
+        """
+        def run(task):
+            start = time.time()
             try:
-                tl.lists.new(list_name, board['id'])
-                print colored('OK', 'green', attrs=['bold'])
-            except RequestException:
-                print colored('Not OK', 'red', attrs=['bold'])
-
-        board_admins_curr = set([m['username'] for m in tl.boards.get_member_filter('admins', board['id'])])
-        board_allmembers_curr = set([m['username'] for m in tl.boards.get_member_filter('all', board['id'])])
-
-        print colored("Adding missing admins to board '%s'" % board_name, 'green', attrs=['bold'])
-        for u in board_admins - board_admins_curr:
-            self.__add_board_member(board, u, 'admin')
-
-        print colored("Adding missing members to board '%s'" % board_name, 'green', attrs=['bold'])
-        for u in board_members - board_allmembers_curr:
-            self.__add_board_member(board, u, 'normal')
\ No newline at end of file
+                task[3]()
+                return task, None, time.time() - start
+            except RequestException as e:
+                return task, e, time.time() - start
+
+        out = output.get()
+        all_ok = True
+        for (resource, action, message, _), e, latency in client.map(run, tasks):
+            out.done(resource, action, message, out.OK if e is None else out.FAILED, latency, e)
+            all_ok &= e is None
+        return all_ok
+
+    @staticmethod
+    def __create_board(client, org, board_name, boards):
+        def create():
+            boards[board_name] = client.new_board(board_name, org['id'])
+        return create
+
+    @staticmethod
+    def __update_board(client, board, state, board_lists, board_admins, board_members):
+        board_lists_curr = set(l['name'] for l in state.lists)
+        # explicit positions keep the configured order of the missing lists although they are added concurrently
+        pos = max([l.get('pos', 0) for l in state.lists] or [0])
+
+        tasks = []
+        for list_name in [l for l in board_lists if l not in board_lists_curr]:
+            pos += 1024
+            tasks.append(('%s:%s' % (board['name'], list_name), 'create_list',
+                          "Adding list '%s' to board '%s'" % (list_name, board['name']),
+                          functools.partial(client.new_list, list_name, board['id'], pos)))
+        for u in board_admins - state.admins:
+            tasks.append(('%s:%s' % (board['name'], u), 'add_admin',
+                          "Adding '%s' as admin member of '%s'" % (u, board['name']),
+                          functools.partial(client.add_board_member, board['id'], u, 'admin')))
+        for u in board_members - state.members:
+            tasks.append(('%s:%s' % (board['name'], u), 'add_member',
+                          "Adding '%s' as normal member of '%s'" % (u, board['name']),
+                          functools.partial(client.add_board_member, board['id'], u, 'normal')))
+        return tasks
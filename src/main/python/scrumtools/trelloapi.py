@@ -0,0 +1,219 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.exceptions import HTTPError
+
+from scrumtools import cache, error, transport
+
+
+BoardState = namedtuple('BoardState', ['lists', 'admins', 'members'])
+
+
+class TrelloClient(object):
+    """
+    A client for the Trello REST API endpoints used by scrum-tools.
+
+    All requests share one keep-alive HTTP session and are authenticated with a credential acquired from the given
+    CredentialPool. Independent requests can be overlapped with map(), which runs them on a fixed pool of at most
+    max_in_flight workers (one pooled connection each). map() and batch() may be called concurrently from any thread;
+    calls from within a pool worker run sequentially in that worker. GET requests are served from the run-scoped
+    request cache (see cache.RequestCache), writes invalidate it.
+    """
+
+    API_URL = 'https://trello.com/1'
+    BATCH_SIZE = 10  # maximum number of URLs accepted by the Trello batch endpoint
+    WAIT_TIMEOUT = 24 * 3600  # waiting with a timeout keeps the main thread responsive to signals
+
+    def __init__(self, credentials, max_in_flight=8):
+        self.credentials = credentials
+        self.__max_in_flight = max(1, int(max_in_flight))
+        self.__session = transport.mount(requests.Session(), pool_connections=1, pool_maxsize=self.__max_in_flight)
+        self.__pool = ThreadPool(self.__max_in_flight)
+        # bounds the requests of all threads (e.g. the tasks of several provisioners sharing this client)
+        self.__in_flight = threading.BoundedSemaphore(self.__max_in_flight)
+        self.__local = threading.local()  # marks the pool workers (see map())
+
+    def request(self, method, path, **params):
+        if method == 'GET':
+            resp = cache.get().get(self.API_URL + path, params, lambda: self.__request(method, path, params))
+        else:
+            try:
+                resp = self.__request(method, path, params)
+            finally:
+                cache.get().invalidate(self.API_URL + path, method, params)
+        return resp.json()
+
+    def __request(self, method, path, params):
+        credential = self.credentials.acquire()
+        params = dict(params, key=credential.key, token=credential.token)
+        with self.__in_flight:
+            resp = self.__session.request(method, self.API_URL + path, params=params)
+        self.credentials.update(credential, resp.headers)
+        resp.raise_for_status()
+        return resp
+
+    def get(self, path, **params):
+        return self.request('GET', path, **params)
+
+    def post(self, path, **params):
+        return self.request('POST', path, **params)
+
+    def put(self, path, **params):
+        return self.request('PUT', path, **params)
+
+    def batch(self, paths):
+        """
+        Issues GET requests for the given paths through the Trello batch endpoint (at most BATCH_SIZE paths per
+        request) and returns the responses in the order of the given paths.
+        """
+        chunks = [paths[i:i + self.BATCH_SIZE] for i in range(0, len(paths), self.BATCH_SIZE)]
+        fetch = lambda c: self.get('/batch', urls=','.join(c))
+        results = []
+        for chunk, resps in zip(chunks, self.map(fetch, chunks)):
+            for path, resp in zip(chunk, resps):
+                if '200' not in resp:
+                    raise HTTPError("Batch GET '%s' failed: %s" % (path, resp.get('message', resp)))
+                results.append(resp['200'])
+        return results
+
+    def map(self, fn, items):
+        """
+        Applies fn to all items with at most max_in_flight concurrent calls and yields the results in item order.
+
+        If called from within a function that is itself executed by map(), fn is applied sequentially in the calling
+        worker (waiting for other workers of a saturated pool would deadlock).
+        """
+        if getattr(self.__local, 'worker', False):
+            for item in items:
+                yield fn(item)
+            return
+
+        results = [self.__pool.apply_async(self.__work, (fn, item)) for item in items]
+        for result in results:
+            yield result.get(self.WAIT_TIMEOUT)
+
+    def __work(self, fn, item):
+        self.__local.worker = True
+        return fn(item)
+
+    def close(self):
+        self.__pool.close()
+        self.__pool.join()
+        self.__session.close()
+
+    def token_members(self):
+        """
+        Returns the usernames of the owners of all tokens of the credential pool (who create and administer the boards).
+        """
+        def username(credential):
+            resp = self.__session.get(self.API_URL + '/members/me',
+                                      params=dict(fields='username', key=credential.key, token=credential.token))
+            self.credentials.update(credential, resp.headers)
+            resp.raise_for_status()
+            return resp.json()['username']
+
+        return set(self.map(username, list(self.credentials)))
+
+    def member(self, member):
+        return self.get('/members/%s' % member)
+
+    def organization(self, organization):
+        return self.get('/organizations/%s' % organization)
+
+    def new_board(self, name, organization_id):
+        return self.post('/boards', name=name, idOrganization=organization_id)
+
+    def new_list(self, name, board_id, pos='bottom'):
+        return self.post('/lists', name=name, idBoard=board_id, pos=pos)
+
+    def new_card(self, name, list_id, desc=None):
+        return self.post('/cards', name=name, idList=list_id, desc=desc)
+
+    def add_board_member(self, board_id, member, member_type):
+        return self.put('/boards/%s/members/%s' % (board_id, member), type=member_type)
+
+
+class BoardReader(object):
+    """
+    Reads the lists and the members of Trello boards.
+
+    Supported read modes are:
+     * 'single' - one GET request per board resource (lists, admins, all members);
+     * 'batch'  - the board resource GETs are grouped into batch requests;
+     * 'nested' - lists and memberships of all organization boards are fetched together with the boards in a single
+                  request; boards which are not covered by it (e.g. newly created ones) are read in batch mode.
+    """
+
+    MODES = ['single', 'batch', 'nested']
+
+    def __init__(self, client, mode='batch'):
+        if mode not in self.MODES:
+            raise error.ConfigError("Invalid Trello read mode '%s' (expected one of %s)" % (
+                mode, ', '.join(self.MODES)))
+
+        self.__client = client
+        self.__mode = mode
+        self.__states = dict()
+
+    def boards(self, organization):
+        if self.__mode != 'nested':
+            return self.__client.get('/organizations/%s/boards' % organization)
+
+        boards = self.__client.get('/organizations/%s/boards' % organization,
+                                   lists='open', memberships='all', members='all', member_fields='username')
+        for board in boards:
+            usernames = dict((m['id'], m['username']) for m in board.pop('members', []))
+            memberships = board.pop('memberships', [])
+            self.__states[board['id']] = BoardState(
+                lists=board.pop('lists', []),
+                admins=set(usernames[m['idMember']] for m in memberships
+                           if m['memberType'] == 'admin' and m['idMember'] in usernames),
+                members=set(usernames.values()))
+        return boards
+
+    def states(self, boards):
+        """
+        Returns a dict that maps the IDs of the given boards to their BoardState.
+        """
+        missing = [b['id'] for b in boards if b['id'] not in self.__states]
+        paths = []
+        for board_id in missing:
+            paths.extend(['/boards/%s/lists' % board_id,
+                          '/boards/%s/members/admins' % board_id,
+                          '/boards/%s/members/all' % board_id])
+
+        if self.__mode == 'single':
+            results = list(self.__client.map(self.__client.get, paths))
+        else:
+            results = self.__client.batch(paths)
+
+        for i, board_id in enumerate(missing):
+            lists, admins, members = results[3 * i:3 * i + 3]
+            self.__states[board_id] = BoardState(lists=lists,
+                                                 admins=set(m['username'] for m in admins),
+                                                 members=set(m['username'] for m in members))
+
+        return dict((b['id'], self.__states[b['id']]) for b in boards)
@@ -0,0 +1,220 @@
+"""
+Copyright 2010-2014 DIMA Research Group, TU Berlin
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Created on Oct 19, 2026
+"""
+
+from __future__ import absolute_import
+
+import os
+import time
+
+from cement.core import controller
+
+from scrumtools import cache, data, error, output, provision, state, transport
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+class WatchController(controller.CementBaseController):
+    class Meta:
+        label = 'watch'
+        interface = controller.IController
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        description = "Watches the users file and provisions the changed groups on GitHub and Trello."
+
+        config_section = 'watch'
+        config_defaults = dict(
+            interval=2,  # seconds between two checks of the users file (without inotify)
+            debounce=5,  # seconds without further changes before a burst of edits is reconciled
+            retry=300,  # seconds before a failed reconciliation is retried (if the users file does not change)
+            refresh=3600,  # seconds after which the cached organization state is read anew
+        )
+
+        arguments = [
+            (['-U', '--users-file'],
+             dict(action='store', metavar='FILE', dest='users_file',
+                  help='a CSV file listing all users')),
+            (['-B', '--debounce'],
+             dict(action='store', metavar='SECONDS', dest='debounce', type=float,
+                  help='seconds without further changes before a burst of edits is reconciled')),
+            output.ARGUMENT,
+        ] + transport.ARGUMENTS
+
+    @controller.expose(hide=True, help="Watches the users file.")
+    def default(self):
+        self.app.log.debug('Watching the users file.')
+
+        # validate required config parameters
+        if not self.app.config.get('core', 'users_file'):
+            raise error.ConfigError("Missing config parameter 'core.users_file'!")
+        if not self.app.config.get('github', 'auth_token') or not self.app.config.get('github', 'auth_id'):
+            raise error.ConfigError("Missing config parameter 'github.auth_id' and/or 'github.auth_token'! "
+                                    "Please run 'scrum-tools github authorize' first! ")
+        if not self.app.config.get('trello', 'auth_key') or not self.app.config.get('trello', 'auth_token'):
+            raise error.ConfigError("Missing config parameter 'trello.auth_key' and/or 'trello.auth_token'! "
+                                    "Please run 'scrum-tools trello authorize' first! ")
+
+        users_file = self.app.config.get('core', 'users_file')
+        retry = float(self.app.config.get('watch', 'retry'))
+        refresh = float(self.app.config.get('watch', 'refresh'))
+
+        # the provisioner keeps its API sessions and the organization state between the reconciliation cycles
+        provisioner = provision.Provisioner(self.app.config)
+        roster_state = state.RosterState(self.app.config.get('core', 'state_file'))
+        watcher = FileWatcher(users_file,
+                              float(self.app.config.get('watch', 'interval')),
+                              float(self.app.config.get('watch', 'debounce')))
+
+        output.get().info("Watching '%s' (%s). Press Ctrl+C to stop." % (users_file, watcher.method), 'cyan')
+        try:
+            refreshed = time.time()
+            pending = True  # reconcile the changes made before the start first
+            while True:
+                if pending:
+                    if time.time() - refreshed > refresh:
+                        provisioner.invalidate()
+                        refreshed = time.time()
+                    # each cycle reads the remote resources anew
+                    cache.get().clear()
+                    ok = self.__reconcile(provisioner, roster_state)
+                    output.flush()
+                # a failed cycle is retried on the next change of the users file, but at the latest after 'retry'
+                pending = watcher.wait(None if ok else retry) or not ok
+        finally:
+            watcher.close()
+            provisioner.close()
+
+    def __reconcile(self, provisioner, roster_state):
+        """
+        Provisions the groups changed since the last successful cycle. Returns False if the cycle should be retried.
+        """
+        try:
+            user_repository = data.UserRepository(self.app.config)
+        except (IOError, ValueError) as e:
+            output.get().info("Cannot read the users file (%s). Waiting for the next change." % e, 'red')
+            return True
+
+        settings = provisioner.settings()
+        fingerprints = user_repository.fingerprints()
+        changed = roster_state.changed(state.scope(self.app.config, 'provision'), settings, fingerprints)
+        if not changed:
+            output.get().info("%s Roster unchanged." % time.strftime('[%H:%M:%S]'), 'cyan')
+            return True
+
+        output.get().info("%s Provisioning %d changed group(s): %s." % (
+            time.strftime('[%H:%M:%S]'), len(changed), ', '.join(sorted(changed, key=int))), 'cyan')
+        status = provisioner.run(user_repository, changed, provision.report)
+        for pool in [provisioner.github_pool, provisioner.trello_client.credentials]:
+            for line in pool.report():
+                self.app.log.debug(line)
+
+        # record the roster only if all changes were applied
+        if not provision.summarize(status):
+            return False
+        roster_state.save(state.scope(self.app.config, 'provision'), settings, fingerprints)
+        return True
+
+
+class FileWatcher(object):
+    """
+    Waits for changes of a file.
+
+    Uses inotify if the pyinotify module is available and polls the modification time, size and inode of the file
+    otherwise. The parent directory is watched, so that editors which replace the file on save are covered as well.
+    """
+
+    def __init__(self, path, interval=2, debounce=5):
+        self.__path = os.path.abspath(path)
+        self.__interval = interval
+        self.__debounce = debounce
+        self.__notifier = None
+
+        if pyinotify is not None:
+            self.__handler = _FileEventHandler(name=os.path.basename(self.__path))
+            manager = pyinotify.WatchManager()
+            manager.add_watch(os.path.dirname(self.__path),
+                              pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | pyinotify.IN_CREATE |
+                              pyinotify.IN_DELETE | pyinotify.IN_MODIFY)
+            self.__notifier = pyinotify.Notifier(manager, self.__handler)
+        else:
+            self.__signature = self.__stat()
+
+    @property
+    def method(self):
+        return 'inotify' if self.__notifier is not None else 'polling every %gs' % self.__interval
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the file changed and no further changes occurred for the debounce period. Returns False if the
+        file did not change within the given timeout (in seconds).
+        """
+        if not self.__changed(timeout):
+            return False
+        while self.__changed(self.__debounce):
+            pass
+        return True
+
+    def close(self):
+        if self.__notifier is not None:
+            self.__notifier.stop()
+            self.__notifier = None
+
+    def __changed(self, timeout):
+        """
+        Returns True as soon as a change is observed and False if none occurred within the timeout (None = forever).
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while deadline is None or time.time() < deadline:
+            step = self.__interval if deadline is None else min(self.__interval, max(0, deadline - time.time()))
+            if self.__notifier is not None:
+                if self.__notifier.check_events(int(step * 1000)):
+                    self.__notifier.read_events()
+                    self.__notifier.process_events()
+                    if self.__handler.pop():
+                        return True
+            else:
+                time.sleep(step)
+                signature = self.__stat()
+                if signature != self.__signature:
+                    self.__signature = signature
+                    return True
+        return False
+
+    def __stat(self):
+        try:
+            s = os.stat(self.__path)
+            return s.st_mtime, s.st_size, s.st_ino
+        except OSError:
+            return None
+
+
+if pyinotify is not None:
+    class _FileEventHandler(pyinotify.ProcessEvent):
+        def my_init(self, name):
+            self.__name = name
+            self.__changed = False
+
+        def process_default(self, event):
+            if event.name == self.__name:
+                self.__changed = True
+
+        def pop(self):
+            changed, self.__changed = self.__changed, False
+            return changed